@@ -0,0 +1,186 @@
+# app/admission.py
+"""
+Admission control: per-route-class concurrency limits with bounded queues.
+
+Each request is sorted into a class by method and path (see classify). A
+class lets `concurrency` requests run at once; up to `queue` more wait for a
+slot, oldest first, for at most ADMISSION_QUEUE_TIMEOUT_SECONDS. A request
+that finds the queue full, or waits too long, is answered straight away with
+503 and Retry-After instead of joining the pile-up on the connection pool.
+Because each class has its own slots, a burst of searches can't take the
+slots (and so the connections) cheap chapter reads need.
+
+Requests outside every class (typeahead, verse of the day, /books, /ready,
+/admin, docs) are served from memory or are operational, so they are never
+shed.
+The pool itself has a deadline too: see PoolTimeoutError in app/database.py.
+
+Each class also carries the Postgres statement_timeout for the queries its
+requests run (statement_timeout_ms in app/database.py).
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Dict, Optional
+from app.config import (
+    ADMISSION_SCRIPTURE_CONCURRENCY,
+    ADMISSION_SCRIPTURE_QUEUE,
+    ADMISSION_SEARCH_CONCURRENCY,
+    ADMISSION_SEARCH_QUEUE,
+    ADMISSION_AUTH_CONCURRENCY,
+    ADMISSION_AUTH_QUEUE,
+    ADMISSION_DEVOTIONAL_READS_CONCURRENCY,
+    ADMISSION_DEVOTIONAL_READS_QUEUE,
+    ADMISSION_DEVOTIONAL_WRITES_CONCURRENCY,
+    ADMISSION_DEVOTIONAL_WRITES_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ADMISSION_RETRY_AFTER_SECONDS,
+    STATEMENT_TIMEOUT_SCRIPTURE_MS,
+    STATEMENT_TIMEOUT_SEARCH_MS,
+    STATEMENT_TIMEOUT_AUTH_MS,
+    STATEMENT_TIMEOUT_DEVOTIONAL_READS_MS,
+    STATEMENT_TIMEOUT_DEVOTIONAL_WRITES_MS,
+)
+from app.database import statement_timeout_ms
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionGate:
+    """A semaphore with a bounded FIFO queue and a wait deadline."""
+
+    def __init__(self, name: str, concurrency: int, queue: int, queue_timeout: float,
+                 statement_timeout_ms: int = 0):
+        self.name = name
+        self.statement_timeout_ms = statement_timeout_ms
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        self.counters = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_timeout": 0}
+
+    async def acquire(self):
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self.counters["admitted"] += 1
+            return
+        if len(self._waiters) >= self.queue:
+            self.counters["shed_queue_full"] += 1
+            raise Overloaded(f"{self.name} queue full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.counters["shed_timeout"] += 1
+            raise Overloaded(f"{self.name} queue wait exceeded {self.queue_timeout:g}s") from None
+        except asyncio.CancelledError:
+            # Client went away; if the slot was already handed over, pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.counters["admitted"] += 1
+
+    def release(self):
+        # Hand the slot straight to the oldest live waiter; `active` stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"concurrency": self.concurrency, "queue": self.queue,
+                "statement_timeout_ms": self.statement_timeout_ms,
+                "active": self.active, "waiting": len(self._waiters), **self.counters}
+
+
+def _gate(name: str, concurrency: int, queue: int, statement_timeout: int) -> AdmissionGate:
+    return AdmissionGate(name, concurrency, queue, ADMISSION_QUEUE_TIMEOUT_SECONDS, statement_timeout)
+
+
+gates: Dict[str, AdmissionGate] = {
+    gate.name: gate for gate in (
+        _gate("scripture", ADMISSION_SCRIPTURE_CONCURRENCY, ADMISSION_SCRIPTURE_QUEUE,
+              STATEMENT_TIMEOUT_SCRIPTURE_MS),
+        _gate("search", ADMISSION_SEARCH_CONCURRENCY, ADMISSION_SEARCH_QUEUE,
+              STATEMENT_TIMEOUT_SEARCH_MS),
+        _gate("auth", ADMISSION_AUTH_CONCURRENCY, ADMISSION_AUTH_QUEUE,
+              STATEMENT_TIMEOUT_AUTH_MS),
+        _gate("devotional_reads", ADMISSION_DEVOTIONAL_READS_CONCURRENCY, ADMISSION_DEVOTIONAL_READS_QUEUE,
+              STATEMENT_TIMEOUT_DEVOTIONAL_READS_MS),
+        _gate("devotional_writes", ADMISSION_DEVOTIONAL_WRITES_CONCURRENCY, ADMISSION_DEVOTIONAL_WRITES_QUEUE,
+              STATEMENT_TIMEOUT_DEVOTIONAL_WRITES_MS),
+    )
+}
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """The route class a request belongs to, or None if it is never shed."""
+    if path.startswith(("/search", "/devotionals/search")):
+        return "search"
+    if path.startswith("/verses/"):
+        return "scripture"
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/devotionals"):
+        return "devotional_reads" if method in ("GET", "HEAD") else "devotional_writes"
+    return None
+
+
+def retry_after_headers() -> dict:
+    return {"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)}
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware; the slot is held until the response body is fully sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        gate = None
+        if scope["type"] == "http":
+            route_class = classify(scope["method"], scope["path"])
+            gate = gates.get(route_class) if route_class else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await gate.acquire()
+        except Overloaded as e:
+            logger.warning("Shedding %s %s: %s", scope["method"], scope["path"], e)
+            await self._reject(send)
+            return
+        token = statement_timeout_ms.set(gate.statement_timeout_ms)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            statement_timeout_ms.reset(token)
+            gate.release()
+
+    @staticmethod
+    async def _reject(send):
+        body = json.dumps({"detail": "Server busy, please retry shortly."}).encode()
+        headers = [(b"content-type", b"application/json"),
+                   (b"content-length", str(len(body)).encode())]
+        headers += [(k.lower().encode(), v.encode()) for k, v in retry_after_headers().items()]
+        await send({"type": "http.response.start", "status": 503, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def admission_stats() -> dict:
+    return {name: gate.stats() for name, gate in gates.items()}
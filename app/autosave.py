@@ -0,0 +1,154 @@
+# app/autosave.py
+"""
+Write-behind buffer for editor autosaves.
+
+`/devotionals/save?autosave=true` only replaces the buffered draft for
+(user, date); a background task writes the drafts with save_current_devotional
+every AUTOSAVE_FLUSH_INTERVAL_SECONDS, so an editor saving every few seconds
+costs one transaction per interval instead of one per keystroke pause.
+
+- An explicit save (no autosave flag) discards the buffered draft and writes
+  immediately; reading today's devotional flushes the user's draft first.
+- Every entry stores when its content was submitted (`submitted_at`, the app
+  server's clock when it was buffered or saved). A draft is only written over
+  content submitted before it, so it never overwrites a newer save or draft,
+  including one made through another worker, however late it is flushed.
+- Memory is bounded by AUTOSAVE_MAX_DRAFTS / AUTOSAVE_MAX_BYTES: past either,
+  the oldest drafts are written before the new one is accepted.
+- On shutdown every buffered draft is written before the pools close. A crash
+  can lose at most one interval of autosaves (never an explicit save).
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import List, Optional
+from app.config import AUTOSAVE_FLUSH_INTERVAL_SECONDS, AUTOSAVE_MAX_DRAFTS, AUTOSAVE_MAX_BYTES
+from app.crud import save_current_devotional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Draft:
+    reflection: str
+    favorite_verse_ids: List[int]
+    buffered_at: datetime
+
+    @property
+    def size(self) -> int:
+        return len(self.reflection.encode()) + 8 * len(self.favorite_verse_ids)
+
+
+class AutosaveBuffer:
+    def __init__(self, interval: float, max_drafts: int, max_bytes: int):
+        self.interval = interval
+        self.max_drafts = max_drafts
+        self.max_bytes = max_bytes
+        # (user_id, devotional_date) -> Draft, oldest first
+        self._drafts: "OrderedDict[tuple, Draft]" = OrderedDict()
+        self._bytes = 0
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"buffered": 0, "coalesced": 0, "written": 0,
+                         "skipped_stale": 0, "forced": 0, "failed": 0}
+
+    def _pop(self, key: tuple) -> Optional[Draft]:
+        draft = self._drafts.pop(key, None)
+        if draft is not None:
+            self._bytes -= draft.size
+        return draft
+
+    async def buffer(self, user_id, devotional_date: date, reflection: str,
+                     favorite_verse_ids: Optional[List[int]]):
+        """Replaces the buffered draft for (user, date)."""
+        key = (user_id, devotional_date)
+        if self._pop(key) is not None:
+            self.counters["coalesced"] += 1
+        draft = Draft(reflection, list(favorite_verse_ids or []), datetime.now(timezone.utc))
+        self._drafts[key] = draft
+        self._bytes += draft.size
+        self.counters["buffered"] += 1
+
+        # Bounded memory: write the oldest drafts now rather than grow
+        while len(self._drafts) > 1 and (
+                len(self._drafts) > self.max_drafts or self._bytes > self.max_bytes):
+            oldest = next(iter(self._drafts))
+            self.counters["forced"] += 1
+            if not await self._write(oldest, self._pop(oldest)):
+                # Database trouble: accept the draft rather than fail the request
+                break
+
+    def discard(self, user_id, devotional_date: date):
+        """Drops the draft for (user, date); an explicit save supersedes it."""
+        self._pop((user_id, devotional_date))
+
+    async def flush_key(self, user_id, devotional_date: date):
+        key = (user_id, devotional_date)
+        draft = self._pop(key)
+        if draft is not None:
+            await self._write(key, draft)
+
+    async def flush(self):
+        """Writes every draft buffered so far; failed ones stay for the next flush."""
+        for key in list(self._drafts):
+            draft = self._pop(key)
+            if draft is not None:
+                await self._write(key, draft)
+
+    def _restore(self, key: tuple, draft: Draft):
+        # Keep an unwritten draft for the next flush unless a newer one arrived meanwhile
+        if key not in self._drafts:
+            self._drafts[key] = draft
+            self._drafts.move_to_end(key, last=False)
+            self._bytes += draft.size
+
+    async def _write(self, key: tuple, draft: Draft) -> bool:
+        user_id, devotional_date = key
+        try:
+            saved = await save_current_devotional(
+                user_id=user_id,
+                devotional_date=devotional_date,
+                reflection=draft.reflection,
+                favorite_verse_ids=draft.favorite_verse_ids,
+                submitted_at=draft.buffered_at,
+                draft=True,
+            )
+        except asyncio.CancelledError:
+            # Shutdown interrupted the periodic flush; close() writes it again
+            self._restore(key, draft)
+            raise
+        except Exception as e:
+            self.counters["failed"] += 1
+            logger.error("Autosave for user %s on %s failed: %s", user_id, devotional_date, e)
+            self._restore(key, draft)
+            return False
+        self.counters["written" if saved is not None else "skipped_stale"] += 1
+        return True
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        """Stops the flush task and writes everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {"drafts": len(self._drafts), "bytes": self._bytes, **self.counters}
+
+
+autosave_buffer = AutosaveBuffer(
+    AUTOSAVE_FLUSH_INTERVAL_SECONDS, AUTOSAVE_MAX_DRAFTS, AUTOSAVE_MAX_BYTES)
@@ -0,0 +1,150 @@
+# app/book_resolver.py
+"""
+In-memory book-name resolution.
+
+Built once at startup from `books.name`, `books.abbreviation` and an alias
+table, so the verse route can turn "john", "Jhn", "1st John", "I John" or
+"Song of Songs" into ids, and reject unknown books or out-of-range chapters
+without touching the database.
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from app.config import BOOK_ALIASES_FILE
+from app.crud import get_scripture_catalog
+from app.warmup import register_warmer
+
+logger = logging.getLogger(__name__)
+
+# Common alternative names -> canonical `books.name`. Extended by BOOK_ALIASES_FILE.
+DEFAULT_BOOK_ALIASES = {
+    "Gen": "Genesis",
+    "Ex": "Exodus",
+    "Exod": "Exodus",
+    "Deut": "Deuteronomy",
+    "Josh": "Joshua",
+    "Judg": "Judges",
+    "Psalm": "Psalms",
+    "Ps": "Psalms",
+    "Prov": "Proverbs",
+    "Eccl": "Ecclesiastes",
+    "Qoheleth": "Ecclesiastes",
+    "Song of Songs": "Song of Solomon",
+    "Song": "Song of Solomon",
+    "Canticles": "Song of Solomon",
+    "Isa": "Isaiah",
+    "Jer": "Jeremiah",
+    "Ezek": "Ezekiel",
+    "Zech": "Zechariah",
+    "Matt": "Matthew",
+    "Mt": "Matthew",
+    "Mk": "Mark",
+    "Lk": "Luke",
+    "Jn": "John",
+    "Phil": "Philippians",
+    "Philem": "Philemon",
+    "Jas": "James",
+    "Revelations": "Revelation",
+    "Apocalypse": "Revelation",
+}
+
+# "1st John", "1John", "I John", "First John" -> "1john"
+_NUMERIC_ORDINAL = re.compile(r"^([123])(?:st|nd|rd)?\s*(\S.*)$")
+_WORD_ORDINAL = re.compile(r"^(first|second|third|iii|ii|i)\s+(.+)$")
+_ORDINAL_WORDS = {"first": "1", "i": "1", "second": "2", "ii": "2", "third": "3", "iii": "3"}
+
+
+def normalize_book_name(name: str) -> str:
+    """Lookup key for a book name: lowercase, ordinal as a digit, no spaces or punctuation."""
+    key = re.sub(r"[.\s_-]+", " ", name.strip().lower()).strip()
+    match = _NUMERIC_ORDINAL.match(key)
+    if match:
+        key = match.group(1) + match.group(2)
+    else:
+        match = _WORD_ORDINAL.match(key)
+        if match:
+            key = _ORDINAL_WORDS[match.group(1)] + match.group(2)
+    return re.sub(r"[^0-9a-z]", "", key)
+
+
+@dataclass(frozen=True)
+class BookEntry:
+    id: int
+    name: str
+    abbreviation: str
+    testament: str
+    position: int
+    # chapter_number -> chapters.id
+    chapter_ids: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def chapter_count(self) -> int:
+        return len(self.chapter_ids)
+
+
+class BookResolver:
+    def __init__(self, catalog: dict, aliases: Optional[Dict[str, str]] = None):
+        chapter_ids = {}
+        for chapter in catalog["chapters"]:
+            chapter_ids.setdefault(chapter["book_id"], {})[chapter["chapter_number"]] = chapter["id"]
+
+        self.books = [
+            BookEntry(chapter_ids=chapter_ids.get(book["id"], {}), **book)
+            for book in catalog["books"]
+        ]
+        self.by_id = {book.id: book for book in self.books}
+
+        self._by_key = {}
+        by_name = {}
+        for book in self.books:
+            by_name[normalize_book_name(book.name)] = book
+            self._by_key[normalize_book_name(book.name)] = book
+            self._by_key.setdefault(normalize_book_name(book.abbreviation), book)
+
+        for alias, canonical in (aliases or {}).items():
+            book = by_name.get(normalize_book_name(canonical))
+            if book is None:
+                logger.warning("Ignoring book alias %r: unknown book %r", alias, canonical)
+                continue
+            self._by_key.setdefault(normalize_book_name(alias), book)
+
+    def lookup_keys(self):
+        """(normalized key, book) pairs for every accepted name, abbreviation and alias."""
+        return self._by_key.items()
+
+    def resolve(self, book_name: str) -> Optional[BookEntry]:
+        return self._by_key.get(normalize_book_name(book_name))
+
+    def resolve_chapter(self, book_name: str, chapter_number: int):
+        """
+        Returns (book, chapter_id). `book` is None for an unknown book and
+        `chapter_id` is None when the chapter is out of range.
+        """
+        book = self.resolve(book_name)
+        if book is None:
+            return None, None
+        return book, book.chapter_ids.get(chapter_number)
+
+
+_resolver: Optional[BookResolver] = None
+
+
+def get_book_resolver() -> Optional[BookResolver]:
+    """The startup-built resolver, or None if it hasn't been built (yet)."""
+    return _resolver
+
+
+def load_book_aliases() -> Dict[str, str]:
+    aliases = dict(DEFAULT_BOOK_ALIASES)
+    if BOOK_ALIASES_FILE:
+        with open(BOOK_ALIASES_FILE, encoding="utf-8") as f:
+            aliases.update(json.load(f))
+    return aliases
+
+
+@register_warmer("book_resolver")
+async def build_book_resolver():
+    global _resolver
+    _resolver = BookResolver(await get_scripture_catalog(), load_book_aliases())
@@ -0,0 +1,107 @@
+# app/cache.py
+"""
+In-process caches for scripture reads.
+
+`negative_cache` remembers requests that found nothing (unknown chapters,
+gibberish searches) so repeated misses from bots and typos don't reach the
+database. It is deliberately separate from any positive cache, with its own
+TTL and size limit, and is cleared whenever the corpus version changes.
+"""
+import logging
+import time
+from collections import OrderedDict
+from app.config import (
+    NEGATIVE_CACHE_TTL_SECONDS,
+    NEGATIVE_CACHE_MAX_ENTRIES,
+    CORPUS_VERSION_CHECK_SECONDS,
+)
+from app.crud import get_corpus_version
+from app.warmup import register_warmer
+from app.scheduler import scheduled_job
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+class NegativeCache:
+    def __init__(self, max_size: int, ttl: float):
+        self._entries = TTLCache(max_size, ttl)
+        self.corpus_version = None
+        self.invalidations = 0
+        self.counters = {}
+
+    def _counter(self, endpoint: str) -> dict:
+        return self.counters.setdefault(endpoint, {"hits": 0, "misses": 0, "stores": 0})
+
+    def contains(self, endpoint: str, key) -> bool:
+        """True if `key` recently returned nothing for `endpoint`."""
+        found = self._entries.get((endpoint, key)) is not None
+        self._counter(endpoint)["hits" if found else "misses"] += 1
+        return found
+
+    def add(self, endpoint: str, key):
+        self._entries.set((endpoint, key), True)
+        self._counter(endpoint)["stores"] += 1
+
+    def set_corpus_version(self, version):
+        if version != self.corpus_version:
+            if self.corpus_version is not None:
+                logger.info("Corpus version changed (%s -> %s), clearing negative cache",
+                            self.corpus_version, version)
+                self.invalidations += 1
+            self._entries.clear()
+            self.corpus_version = version
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._entries.max_size,
+            "ttl_seconds": self._entries.ttl,
+            "evictions": self._entries.evictions,
+            "corpus_version": self.corpus_version,
+            "invalidations": self.invalidations,
+            "endpoints": self.counters,
+        }
+
+
+negative_cache = NegativeCache(NEGATIVE_CACHE_MAX_ENTRIES, NEGATIVE_CACHE_TTL_SECONDS)
+
+
+# Checked on every worker: each one has its own caches
+@register_warmer("corpus_version")
+@scheduled_job("corpus_version", CORPUS_VERSION_CHECK_SECONDS)
+async def refresh_corpus_version():
+    negative_cache.set_corpus_version(await get_corpus_version())
@@ -1,204 +1,766 @@
 from app.database import db_connection
-from datetime import date
+from app.config import SCRIPTURE_BACKEND
+from app import scripture_sqlite
+from app.singleflight import single_flight
+from app.search_query import SearchNode, to_tsquery_text
+from datetime import date, datetime, timezone
+import json
+import logging
 from typing import Optional, List, Dict, Any
 
+logger = logging.getLogger(__name__)
+
+# SQL for the hot scripture reads. Kept at module level so startup warmup can
+# prepare exactly the same statements on every pooled connection.
+VERSES_BY_CHAPTER_QUERY = """
+    SELECT v.verse_number, v.text, v.id 
+    FROM verses v
+    JOIN chapters c ON v.chapter_id = c.id
+    JOIN books b ON c.book_id = b.id
+    WHERE b.name = $1 AND c.chapter_number = $2
+    ORDER BY v.verse_number;
+"""
+
+VERSES_BY_CHAPTER_ID_QUERY = """
+    SELECT verse_number, text, id
+    FROM verses
+    WHERE chapter_id = $1
+    ORDER BY verse_number;
+"""
+
+ILIKE_SEARCH_QUERY = """
+    SELECT 
+        b.name AS book_name,
+        c.chapter_number,
+        v.verse_number,
+        v.text,
+        1.0 AS rank
+    FROM 
+        verses v
+    JOIN 
+        chapters c ON v.chapter_id = c.id
+    JOIN 
+        books b ON c.book_id = b.id
+    WHERE 
+        v.text ILIKE $1
+    ORDER BY 
+        b.name, c.chapter_number, v.verse_number
+    LIMIT
+        $2;
+"""
+
+FULL_TEXT_SEARCH_QUERY = """
+    SELECT 
+        b.name AS book_name,
+        c.chapter_number,
+        v.verse_number,
+        v.text,
+        ts_rank(to_tsvector('english', v.text), plainto_tsquery('english', $1))::double precision AS rank
+    FROM 
+        verses v
+    JOIN 
+        chapters c ON v.chapter_id = c.id
+    JOIN 
+        books b ON c.book_id = b.id
+    WHERE 
+        to_tsvector('english', v.text) @@ plainto_tsquery('english', $1)
+    ORDER BY 
+        rank DESC
+    LIMIT
+        $2;
+"""
+
+# Advanced search: $1 is tsquery text rendered by app.search_query from a
+# validated parse tree. querytree() = 'T' means the query has nothing the index
+# can use (e.g. only exclusions left after stopword removal), so refuse it
+# rather than scan every verse.
+ADVANCED_SEARCH_QUERY = """
+    SELECT 
+        b.name AS book_name,
+        c.chapter_number,
+        v.verse_number,
+        v.text,
+        ts_rank(to_tsvector('english', v.text), to_tsquery('english', $1))::double precision AS rank
+    FROM 
+        verses v
+    JOIN 
+        chapters c ON v.chapter_id = c.id
+    JOIN 
+        books b ON c.book_id = b.id
+    WHERE 
+        querytree(to_tsquery('english', $1)) <> 'T'
+        AND to_tsvector('english', v.text) @@ to_tsquery('english', $1)
+    ORDER BY 
+        rank DESC
+    LIMIT
+        $2;
+"""
+
+VERSES_BY_IDS_QUERY = """
+    SELECT v.id, b.name AS book_name, c.chapter_number, v.verse_number, v.text
+    FROM verses v
+    JOIN chapters c ON v.chapter_id = c.id
+    JOIN books b ON c.book_id = b.id
+    WHERE v.id = ANY($1::int[]);
+"""
+
+# Faceted search: one statement returns the ranked page together with hit
+# counts over the whole match set. `matches` and `page` are referenced more
+# than once, so Postgres materializes each a single time and the counts cost
+# one extra aggregate, not extra searches. $2 is the page size, $3/$4 an
+# optional book name / testament filter for the page.
+FACETED_SEARCH_TEMPLATE = """
+    WITH matches AS (
+        SELECT
+            b.name AS book_name,
+            b.testament,
+            b.position,
+            c.chapter_number,
+            v.verse_number,
+            v.text,
+            {rank} AS rank
+        FROM
+            verses v
+        JOIN
+            chapters c ON v.chapter_id = c.id
+        JOIN
+            books b ON c.book_id = b.id
+        WHERE
+            {condition}
+    ),
+    page AS (
+        SELECT
+            book_name, chapter_number, verse_number, text, rank,
+            row_number() OVER (ORDER BY {order}) AS ordinal
+        FROM matches
+        WHERE ($3::text IS NULL OR book_name = $3)
+          AND ($4::text IS NULL OR testament = $4)
+    ),
+    book_counts AS (
+        SELECT book_name, testament, position, count(*) AS hits
+        FROM matches
+        GROUP BY book_name, testament, position
+    )
+    SELECT
+        (SELECT count(*) FROM matches) AS total,
+        (SELECT count(*) FROM page) AS filtered_total,
+        (SELECT coalesce(json_agg(json_build_object(
+                    'book_name', book_name, 'testament', testament, 'count', hits)
+                    ORDER BY hits DESC, position), '[]')
+         FROM book_counts) AS book_counts,
+        (SELECT coalesce(json_agg(json_build_object(
+                    'book_name', book_name, 'chapter_number', chapter_number,
+                    'verse_number', verse_number, 'text', text, 'rank', rank)
+                    ORDER BY ordinal), '[]')
+         FROM page
+         WHERE $2::int IS NULL OR ordinal <= $2) AS results;
+"""
+
+FACETED_ILIKE_SEARCH_QUERY = FACETED_SEARCH_TEMPLATE.format(
+    rank="1.0",
+    condition="v.text ILIKE $1",
+    order="book_name, chapter_number, verse_number",
+)
+
+FACETED_FULL_TEXT_SEARCH_QUERY = FACETED_SEARCH_TEMPLATE.format(
+    rank="ts_rank(to_tsvector('english', v.text), plainto_tsquery('english', $1))::double precision",
+    condition="to_tsvector('english', v.text) @@ plainto_tsquery('english', $1)",
+    order="rank DESC",
+)
+
+FACETED_ADVANCED_SEARCH_QUERY = FACETED_SEARCH_TEMPLATE.format(
+    rank="ts_rank(to_tsvector('english', v.text), to_tsquery('english', $1))::double precision",
+    condition="querytree(to_tsquery('english', $1)) <> 'T'\n"
+              "            AND to_tsvector('english', v.text) @@ to_tsquery('english', $1)",
+    order="rank DESC",
+)
+
 # Function to get verses by book and chapter
 
 
+@single_flight("verses_by_chapter")
 async def get_verses_by_book_and_chapter(book_name: str, chapter_number: int):
-    async with db_connection() as conn:
-        # SQL query to get the verses based on book and chapter
-        query = """
-            SELECT v.verse_number, v.text, v.id 
-            FROM verses v
-            JOIN chapters c ON v.chapter_id = c.id
-            JOIN books b ON c.book_id = b.id
-            WHERE b.name = $1 AND c.chapter_number = $2
-            ORDER BY v.verse_number;
-        """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.get_verses_by_book_and_chapter(book_name, chapter_number)
 
+    async with db_connection(readonly=True) as conn:
         # Fetch the verses
-        verses = await conn.fetch(query, book_name, chapter_number)
-
-        # Close the connection
-        await conn.close()
+        verses = await conn.fetch(VERSES_BY_CHAPTER_QUERY, book_name, chapter_number)
 
         # Convert result into a list of dictionaries
         return [dict(verse) for verse in verses]
 
+
+@single_flight("verses_by_chapter_id")
+async def get_verses_by_chapter_id(chapter_id: int):
+    """
+    Same result as get_verses_by_book_and_chapter, for a chapter already
+    resolved by the book resolver. Skips the books/chapters joins.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.get_verses_by_chapter_id(chapter_id)
+
+    async with db_connection(readonly=True) as conn:
+        verses = await conn.fetch(VERSES_BY_CHAPTER_ID_QUERY, chapter_id)
+        return [dict(verse) for verse in verses]
+
+
+@single_flight("verses_by_ids")
+async def get_verses_by_ids(verse_ids: List[int]):
+    """
+    Verses with their book and chapter for a set of ids (primary key lookups).
+    Returned in no particular order; callers index them by `id`.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.get_verses_by_ids(verse_ids)
+
+    async with db_connection(readonly=True) as conn:
+        results = await conn.fetch(VERSES_BY_IDS_QUERY, verse_ids)
+        return [dict(result) for result in results]
+
+CATALOG_CHAPTERS_QUERY = """
+    SELECT c.id, c.book_id, c.chapter_number, count(v.id) AS verse_count
+    FROM chapters c
+    LEFT JOIN verses v ON v.chapter_id = c.id
+    GROUP BY c.id, c.book_id, c.chapter_number
+    ORDER BY c.book_id, c.chapter_number;
+"""
+
+async def get_scripture_catalog():
+    """
+    Returns every book and chapter (ids, names, numbers, verse counts) for
+    building the in-memory book resolver and table of contents.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.get_scripture_catalog()
+
+    async with db_connection(readonly=True) as conn:
+        books = await conn.fetch(
+            "SELECT id, name, abbreviation, testament, position FROM books ORDER BY position;")
+        chapters = await conn.fetch(CATALOG_CHAPTERS_QUERY)
+        return {
+            "books": [dict(book) for book in books],
+            "chapters": [dict(chapter) for chapter in chapters],
+        }
+
+async def get_corpus_version() -> str:
+    """
+    Cheap fingerprint of the scripture tables ("<verse count>:<max verse id>").
+    Changes whenever the corpus is re-imported.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.get_corpus_version()
+
+    async with db_connection(readonly=True) as conn:
+        return await conn.fetchval(
+            "SELECT count(*) || ':' || coalesce(max(id), 0) FROM verses;")
+
+async def get_term_frequencies():
+    """
+    Returns (word, occurrences) for every distinct lowercase word in the verses,
+    aggregated inside Postgres with ts_stat over the 'simple' configuration.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.get_term_frequencies()
+
+    async with db_connection(readonly=True) as conn:
+        rows = await conn.fetch("""
+            SELECT word, nentry
+            FROM ts_stat('SELECT to_tsvector(''simple'', text) FROM verses');
+        """)
+        return [(row['word'], row['nentry']) for row in rows]
+
 # Function to search the Bible for specific text
 
 
+@single_flight("search")
 async def search_bible_text(search_query: str, limit: int = 50):
-    async with db_connection() as conn:
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.search_bible_text(search_query, limit)
+
+    async with db_connection(readonly=True) as conn:
         # Check if the query is a common word or very short
         if len(search_query.strip()) < 4:
             # For common words or short queries, use ILIKE for more inclusive results
-            query = """
-                SELECT 
-                    b.name AS book_name,
-                    c.chapter_number,
-                    v.verse_number,
-                    v.text,
-                    1.0 AS rank
-                FROM 
-                    verses v
-                JOIN 
-                    chapters c ON v.chapter_id = c.id
-                JOIN 
-                    books b ON c.book_id = b.id
-                WHERE 
-                    v.text ILIKE $1
-                ORDER BY 
-                    b.name, c.chapter_number, v.verse_number
-                LIMIT
-                    $2;
-            """
-
             # Use % for wildcard matching
             like_pattern = f'% {search_query} %'
-            results = await conn.fetch(query, like_pattern, limit)
+            results = await conn.fetch(ILIKE_SEARCH_QUERY, like_pattern, limit)
         else:
             # For longer queries, use full-text search
-            query = """
-                SELECT 
-                    b.name AS book_name,
-                    c.chapter_number,
-                    v.verse_number,
-                    v.text,
-                    ts_rank(to_tsvector('english', v.text), plainto_tsquery('english', $1))::double precision AS rank
-                FROM 
-                    verses v
-                JOIN 
-                    chapters c ON v.chapter_id = c.id
-                JOIN 
-                    books b ON c.book_id = b.id
-                WHERE 
-                    to_tsvector('english', v.text) @@ plainto_tsquery('english', $1)
-                ORDER BY 
-                    rank DESC
-                LIMIT
-                    $2;
-            """
-
-            results = await conn.fetch(query, search_query, limit)
+            results = await conn.fetch(FULL_TEXT_SEARCH_QUERY, search_query, limit)
 
         # If no results with the first method, try the other method
         if not results:
             if len(search_query.strip()) < 4:
                 # Try full-text search as fallback
-                query = """
-                    SELECT 
-                        b.name AS book_name,
-                        c.chapter_number,
-                        v.verse_number,
-                        v.text,
-                        ts_rank(to_tsvector('english', v.text), plainto_tsquery('english', $1))::double precision AS rank
-                    FROM 
-                        verses v
-                    JOIN 
-                        chapters c ON v.chapter_id = c.id
-                    JOIN 
-                        books b ON c.book_id = b.id
-                    WHERE 
-                        to_tsvector('english', v.text) @@ plainto_tsquery('english', $1)
-                    ORDER BY 
-                        rank DESC
-                    LIMIT
-                        $2;
-                """
-                results = await conn.fetch(query, search_query, limit)
+                results = await conn.fetch(FULL_TEXT_SEARCH_QUERY, search_query, limit)
             else:
                 # Try ILIKE as fallback
-                query = """
-                    SELECT 
-                        b.name AS book_name,
-                        c.chapter_number,
-                        v.verse_number,
-                        v.text,
-                        1.0 AS rank
-                    FROM 
-                        verses v
-                    JOIN 
-                        chapters c ON v.chapter_id = c.id
-                    JOIN 
-                        books b ON c.book_id = b.id
-                    WHERE 
-                        v.text ILIKE $1
-                    ORDER BY 
-                        b.name, c.chapter_number, v.verse_number
-                    LIMIT
-                        $2;
-                """
                 like_pattern = f'%{search_query}%'
-                results = await conn.fetch(query, like_pattern, limit)
+                results = await conn.fetch(ILIKE_SEARCH_QUERY, like_pattern, limit)
 
         # Convert result into a list of dictionaries
         return [dict(result) for result in results]
 
 
-async def get_current_devotional(user_id: str, devotional_date: date):
+@single_flight("search_advanced")
+async def search_bible_advanced(parsed_query: SearchNode, limit: int = 50):
+    """
+    Phrase, proximity, prefix and boolean search for a query already parsed
+    and validated by app.search_query.parse_search_query. Uses the positional
+    GIN full-text index on verses.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        return await scripture_sqlite.search_bible_advanced(parsed_query, limit)
+
+    async with db_connection(readonly=True) as conn:
+        results = await conn.fetch(ADVANCED_SEARCH_QUERY, to_tsquery_text(parsed_query), limit)
+        return [dict(result) for result in results]
+
+
+@single_flight("search_faceted")
+async def search_bible_faceted(
+    search_query: str,
+    limit: Optional[int] = 50,
+    book: Optional[str] = None,
+    testament: Optional[str] = None,
+    parsed_query: Optional[SearchNode] = None,
+):
+    """
+    A ranked page of matches plus per-book and per-testament hit counts over
+    the whole match set, in a single statement.
+
+    Args:
+        search_query: The raw query text.
+        limit: Page size (None for every match).
+        book: Canonical `books.name` to restrict the page to.
+        testament: 'OT' or 'NT' to restrict the page to.
+        parsed_query: Parsed advanced query; when given the advanced search is
+                      used, otherwise the same strategy and fallback as
+                      search_bible_text.
+
+    Returns:
+        {"total", "filtered_total", "testament_counts", "book_counts", "results"}.
+        The counts always cover every match, so clients can offer the other
+        books while a filter is applied.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        page = await scripture_sqlite.search_bible_faceted(
+            search_query, limit, book, testament, parsed_query)
+    else:
+        async with db_connection(readonly=True) as conn:
+            if parsed_query is not None:
+                row = await conn.fetchrow(
+                    FACETED_ADVANCED_SEARCH_QUERY, to_tsquery_text(parsed_query), limit, book, testament)
+            elif len(search_query.strip()) < 4:
+                row = await conn.fetchrow(
+                    FACETED_ILIKE_SEARCH_QUERY, f'% {search_query} %', limit, book, testament)
+                if not row['total']:
+                    row = await conn.fetchrow(
+                        FACETED_FULL_TEXT_SEARCH_QUERY, search_query, limit, book, testament)
+            else:
+                row = await conn.fetchrow(
+                    FACETED_FULL_TEXT_SEARCH_QUERY, search_query, limit, book, testament)
+                if not row['total']:
+                    row = await conn.fetchrow(
+                        FACETED_ILIKE_SEARCH_QUERY, f'%{search_query}%', limit, book, testament)
+
+        page = {
+            "total": row['total'],
+            "filtered_total": row['filtered_total'],
+            "book_counts": json.loads(row['book_counts']),
+            "results": json.loads(row['results']),
+        }
+
+    testament_counts = {"OT": 0, "NT": 0}
+    for entry in page["book_counts"]:
+        testament_counts[entry["testament"]] = testament_counts.get(entry["testament"], 0) + entry["count"]
+    page["testament_counts"] = testament_counts
+    return page
+
+
+# --- Aggregates refreshed by the background scheduler (app/scheduler.py) ---
+
+
+async def refresh_bible_stats():
+    async with db_connection() as conn:
+        await conn.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY bible_stats;")
+
+
+async def prune_favorite_buckets(retention_days: int):
+    async with db_connection() as conn:
+        await conn.execute(
+            "DELETE FROM favorite_verse_daily WHERE day < CURRENT_DATE - $1::int;", retention_days)
+
+
+# favorite_verse_daily counts devotionals, and one user has a devotional per
+# day: the candidates it ranks are re-checked for $2 distinct users in the
+# window. The check runs lazily down the ranking until $3 verses pass, and
+# each one stops counting at $2.
+POPULAR_VERSES_QUERY = """
+    WITH candidates AS (
+        SELECT verse_id, sum(favorites)::int AS favorites
+        FROM favorite_verse_daily
+        WHERE day > CURRENT_DATE - $1::int
+        GROUP BY verse_id
+        HAVING sum(favorites) >= $2
+    )
+    SELECT verse_id, favorites
+    FROM candidates c
+    WHERE (
+        SELECT count(*) FROM (
+            SELECT DISTINCT d.user_id
+            FROM devotional_favorite_verses dfv
+            JOIN devotionals d ON d.devotional_id = dfv.devotional_id
+            WHERE dfv.verse_id = c.verse_id
+              AND d.devotional_date > CURRENT_DATE - $1::int
+            LIMIT $2
+        ) users
+    ) >= $2
+    ORDER BY favorites DESC, verse_id
+    LIMIT $3;
+"""
+
+
+async def get_popular_verses(days: int, min_users: int, limit: int):
+    """
+    The most favorited verses in devotionals dated within the last `days`
+    days (today included), as {"verse_id", "favorites"}. Verses favorited by
+    fewer than `min_users` different users in that window are left out.
+    """
+    async with db_connection(readonly=True) as conn:
+        results = await conn.fetch(POPULAR_VERSES_QUERY, days, min_users, limit)
+        return [dict(result) for result in results]
+
+
+# Per-user devotional summary (devotional_stats), updated inside
+# save_current_devotional's transaction. Appending a date after the last one
+# is O(1); the WHERE makes it a no-op (no row returned) for an earlier date,
+# which falls back to DEVOTIONAL_STATS_REBUILD_QUERY.
+DEVOTIONAL_STATS_APPEND_QUERY = """
+    INSERT INTO devotional_stats AS s (
+        user_id, total_entries, current_streak, longest_streak,
+        first_entry_date, last_entry_date, monthly_counts
+    )
+    VALUES ($1, 1, 1, 1, $2::date, $2::date, jsonb_build_object(to_char($2::date, 'YYYY-MM'), 1))
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_entries = s.total_entries + 1,
+        current_streak = CASE WHEN $2::date = s.last_entry_date + 1
+                              THEN s.current_streak + 1 ELSE 1 END,
+        longest_streak = GREATEST(s.longest_streak,
+                                  CASE WHEN $2::date = s.last_entry_date + 1
+                                       THEN s.current_streak + 1 ELSE 1 END),
+        last_entry_date = $2::date,
+        monthly_counts = s.monthly_counts || jsonb_build_object(
+            to_char($2::date, 'YYYY-MM'),
+            coalesce((s.monthly_counts ->> to_char($2::date, 'YYYY-MM'))::int, 0) + 1),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE
+        $2::date > s.last_entry_date
+    RETURNING user_id;
+"""
+
+# Recomputes one user's summary from their devotional dates (gaps and islands:
+# consecutive dates minus their row number share the same value).
+DEVOTIONAL_STATS_REBUILD_QUERY = """
+    WITH days AS (
+        SELECT
+            devotional_date AS day,
+            devotional_date - (row_number() OVER (ORDER BY devotional_date))::int AS island
+        FROM devotionals
+        WHERE user_id = $1
+    ),
+    islands AS (
+        SELECT max(day) AS last_day, count(*) AS length
+        FROM days
+        GROUP BY island
+    ),
+    months AS (
+        SELECT to_char(day, 'YYYY-MM') AS month, count(*) AS entries
+        FROM days
+        GROUP BY 1
+    )
+    INSERT INTO devotional_stats AS s (
+        user_id, total_entries, current_streak, longest_streak,
+        first_entry_date, last_entry_date, monthly_counts
+    )
+    SELECT
+        $1,
+        (SELECT count(*) FROM days),
+        (SELECT length FROM islands ORDER BY last_day DESC LIMIT 1),
+        (SELECT max(length) FROM islands),
+        (SELECT min(day) FROM days),
+        (SELECT max(day) FROM days),
+        (SELECT coalesce(jsonb_object_agg(month, entries), '{}'::jsonb) FROM months)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_entries = EXCLUDED.total_entries,
+        current_streak = EXCLUDED.current_streak,
+        longest_streak = EXCLUDED.longest_streak,
+        first_entry_date = EXCLUDED.first_entry_date,
+        last_entry_date = EXCLUDED.last_entry_date,
+        monthly_counts = EXCLUDED.monthly_counts,
+        updated_at = CURRENT_TIMESTAMP;
+"""
+
+
+async def get_devotional_stats(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The user's devotional summary row (a single primary-key lookup), or None if
+    they have never saved a devotional. `current_streak` is as of the last
+    entry; callers decide whether it is still running.
+    """
+    async with db_connection(readonly=True) as conn:
+        record = await conn.fetchrow("""
+            SELECT
+                total_entries,
+                current_streak,
+                longest_streak,
+                first_entry_date,
+                last_entry_date,
+                monthly_counts
+            FROM devotional_stats
+            WHERE user_id = $1;
+        """, user_id)
+        if not record:
+            return None
+        stats = dict(record)
+        stats['monthly_counts'] = json.loads(stats['monthly_counts'])
+        return stats
+
+
+# Full-text search over one user's reflections. The (user_id, reflection_tsv)
+# GIN index answers the WHERE clause; ts_headline, the expensive part, only
+# runs on the returned page. Keyset pagination: $4/$5 are the (rank,
+# devotional_id) of the last row of the previous page.
+DEVOTIONAL_SEARCH_QUERY = """
+    WITH query AS (
+        SELECT websearch_to_tsquery('english', $2) AS q
+    ),
+    page AS (
+        SELECT
+            d.devotional_id,
+            d.devotional_date,
+            d.reflection,
+            ts_rank(d.reflection_tsv, query.q) AS rank
+        FROM
+            devotionals d, query
+        WHERE
+            d.user_id = $1
+            AND d.reflection_tsv @@ query.q
+            AND ($4::real IS NULL
+                 OR (ts_rank(d.reflection_tsv, query.q), d.devotional_id) < ($4::real, $5::int))
+        ORDER BY
+            rank DESC, d.devotional_id DESC
+        LIMIT $3
+    )
+    SELECT
+        page.devotional_id,
+        page.devotional_date,
+        page.rank,
+        ts_headline('english', page.reflection, query.q,
+                    'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10')
+            AS snippet
+    FROM
+        page, query
+    ORDER BY
+        page.rank DESC, page.devotional_id DESC;
+"""
+
+
+async def search_devotionals(
+    user_id: str,
+    search_query: str,
+    limit: int = 20,
+    after: Optional[tuple] = None
+) -> List[Dict[str, Any]]:
+    """
+    Ranked full-text search over a user's own devotional reflections.
+
+    Args:
+        user_id: The ID of the user; other users' entries are never matched.
+        search_query: Web-search style query ("quoted phrases", -exclusions, or).
+        limit: Maximum number of results.
+        after: (rank, devotional_id) of the last result of the previous page.
+
+    Returns:
+        A list of dictionaries with devotional_id, devotional_date, rank and a
+        snippet with matches wrapped in <mark></mark>.
+    """
+    after_rank, after_id = after if after else (None, None)
+    async with db_connection(readonly=True) as conn:
+        results = await conn.fetch(
+            DEVOTIONAL_SEARCH_QUERY, user_id, search_query, limit, after_rank, after_id)
+        return [dict(result) for result in results]
+
+
+# Export: both cursors walk the user's devotionals in (devotional_date,
+# devotional_id) order, so favorites can be merged in as they stream past.
+EXPORT_DEVOTIONALS_QUERY = """
+    SELECT
+        devotional_id,
+        user_id,
+        devotional_date,
+        reflection,
+        created_at,
+        updated_at
+    FROM
+        devotionals
+    WHERE
+        user_id = $1
+        AND ($2::date IS NULL OR devotional_date >= $2)
+        AND ($3::date IS NULL OR devotional_date <= $3)
+    ORDER BY
+        devotional_date, devotional_id;
+"""
+
+EXPORT_FAVORITES_QUERY = """
+    SELECT
+        d.devotional_id,
+        v.id as verse_id,
+        b.name as book_name,
+        c.chapter_number,
+        v.verse_number,
+        v.text
+    FROM
+        devotionals d
+    JOIN
+        devotional_favorite_verses dfv ON dfv.devotional_id = d.devotional_id
+    JOIN
+        verses v ON dfv.verse_id = v.id
+    JOIN
+        chapters c ON v.chapter_id = c.id
+    JOIN
+        books b ON c.book_id = b.id
+    WHERE
+        d.user_id = $1
+        AND ($2::date IS NULL OR d.devotional_date >= $2)
+        AND ($3::date IS NULL OR d.devotional_date <= $3)
+    ORDER BY
+        d.devotional_date, d.devotional_id, b.id, c.chapter_number, v.verse_number;
+"""
+
+# Rows fetched per round trip by the export cursors
+EXPORT_PREFETCH_ROWS = 200
+
+
+async def export_devotionals(
+    user_id: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    Streams every devotional of a user (optionally within a date range), oldest
+    first, each with its `favorite_verses`.
+
+    An async generator: rows come from two server-side cursors read side by
+    side in one repeatable-read snapshot, so memory stays at one devotional
+    plus the prefetch buffers however long the journal is. The connection is
+    held until the generator is exhausted or closed.
+    """
+    async with db_connection(readonly=True) as conn:
+        async with conn.transaction(isolation='repeatable_read', readonly=True):
+            favorites = conn.cursor(
+                EXPORT_FAVORITES_QUERY, user_id, start_date, end_date,
+                prefetch=EXPORT_PREFETCH_ROWS).__aiter__()
+            favorite = await anext(favorites, None)
+
+            async for record in conn.cursor(
+                    EXPORT_DEVOTIONALS_QUERY, user_id, start_date, end_date,
+                    prefetch=EXPORT_PREFETCH_ROWS):
+                devotional = dict(record)
+                devotional['favorite_verses'] = []
+                while favorite is not None and favorite['devotional_id'] == devotional['devotional_id']:
+                    devotional['favorite_verses'].append(dict(favorite))
+                    favorite = await anext(favorites, None)
+                yield devotional
+
+
+# A devotional with its favorite verses (in Bible order) as a JSON array
+DEVOTIONAL_WITH_FAVORITES_QUERY = """
+    SELECT
+        d.devotional_id,
+        d.user_id,
+        d.devotional_date,
+        d.reflection,
+        d.created_at,
+        d.updated_at,
+        (SELECT coalesce(json_agg(json_build_object(
+                    'verse_id', v.id, 'book_name', b.name, 'chapter_number', c.chapter_number,
+                    'verse_number', v.verse_number, 'text', v.text)
+                    ORDER BY b.id, c.chapter_number, v.verse_number), '[]')
+         FROM devotional_favorite_verses dfv
+         JOIN verses v ON dfv.verse_id = v.id
+         JOIN chapters c ON v.chapter_id = c.id
+         JOIN books b ON c.book_id = b.id
+         WHERE dfv.devotional_id = d.devotional_id) AS favorite_verses
+    FROM devotionals d
+    WHERE d.user_id = $1 AND d.devotional_date = $2;
+"""
+
+
+async def get_current_devotional(user_id: str, devotional_date: date, from_primary: bool = False):
     """
     Retrieves a single devotional entry for a specific user and date.
 
     Args:
         user_id: The ID of the user.
         devotional_date: The specific date of the devotional.
+        from_primary: Read from the primary instead of the read replica. Use it
+                      right after a write so the result can't be stale.
 
     Returns:
         A dictionary representing the devotional record if found, otherwise None.
         Alternatively, returns a DevotionalEntry Pydantic model instance or None.
     """
-    async with db_connection() as conn:
-        # Ensure all columns needed are selected
-        devotional_query = """
-            SELECT
-                devotional_id,
-                user_id,
-                devotional_date,
-                reflection,
-                created_at,
-                updated_at
-            FROM
-                devotionals
-            WHERE
-                user_id = $1 AND devotional_date = $2;
-        """
-
+    async with db_connection(readonly=not from_primary) as conn:
+        # One round trip: the favorites come along as a JSON array.
         # Use fetchrow as we expect at most one record due to the UNIQUE constraint
-        devotional_record = await conn.fetchrow(devotional_query, user_id, devotional_date)
+        devotional_record = await conn.fetchrow(DEVOTIONAL_WITH_FAVORITES_QUERY, user_id, devotional_date)
 
         if not devotional_record:
             return None
 
         devotional_data = dict(devotional_record)
-        devotional_id = devotional_data['devotional_id']
+        devotional_data['favorite_verses'] = json.loads(devotional_data['favorite_verses'])
+        return devotional_data
 
-        favorite_verses_query = """
-            SELECT
-                v.id as verse_id,
-                b.name as book_name,
-                c.chapter_number,
-                v.verse_number,
-                v.text
-            FROM
-                devotional_favorite_verses dfv
-            JOIN
-                verses v ON dfv.verse_id = v.id
-            JOIN
-                chapters c ON v.chapter_id = c.id
-            JOIN
-                books b ON c.book_id = b.id
-            WHERE
-                dfv.devotional_id = $1
-            ORDER BY
-                b.id, c.chapter_number, v.verse_number;
-        """
-        favorite_verses_records = await conn.fetch(favorite_verses_query, devotional_id)
-        devotional_data['favorite_verses'] = [
-            dict(verse) for verse in favorite_verses_records]
 
-        return devotional_data
+# Replaces a devotional's favorites with $2, applies the change to
+# favorite_verse_daily for its date ($3) and returns the new favorites, so the
+# caller needn't read them back. The DELETE and INSERT touch disjoint rows
+# (not in / in $2), so they can share a statement; the final SELECT can't see
+# their rows, but the favorites are exactly the verses in $2.
+FAVORITES_SYNC_QUERY = """
+    WITH removed AS (
+        DELETE FROM devotional_favorite_verses
+        WHERE devotional_id = $1::int AND verse_id <> ALL ($2::int[])
+        RETURNING verse_id, -1 AS delta
+    ),
+    added AS (
+        INSERT INTO devotional_favorite_verses (devotional_id, verse_id)
+        SELECT $1::int, unnest($2::int[])
+        ON CONFLICT (devotional_id, verse_id) DO NOTHING
+        RETURNING verse_id, 1 AS delta
+    ),
+    counted AS (
+        INSERT INTO favorite_verse_daily AS f (verse_id, day, favorites)
+        SELECT verse_id, $3::date, sum(delta)
+        FROM (SELECT * FROM removed UNION ALL SELECT * FROM added) changes
+        GROUP BY verse_id
+        ON CONFLICT (day, verse_id) DO UPDATE SET favorites = f.favorites + EXCLUDED.favorites
+    )
+    SELECT
+        v.id AS verse_id,
+        b.name AS book_name,
+        c.chapter_number,
+        v.verse_number,
+        v.text
+    FROM verses v
+    JOIN chapters c ON v.chapter_id = c.id
+    JOIN books b ON c.book_id = b.id
+    WHERE v.id = ANY ($2::int[])
+    ORDER BY b.id, c.chapter_number, v.verse_number;
+"""
 
 
 async def save_current_devotional(
@@ -206,8 +768,12 @@ async def save_current_devotional(
     devotional_date: date,
     reflection: str,
     # Expecting a list of verse IDs (integers)
-    favorite_verse_ids: Optional[List[int]] = None
-) -> Dict[str, Any]:  # Returns the main saved/updated devotional record as a dict
+    favorite_verse_ids: Optional[List[int]] = None,
+    # When the content was submitted (app server clock); defaults to now
+    submitted_at: Optional[datetime] = None,
+    # Autosave draft: only overwrite content submitted before `submitted_at`
+    draft: bool = False
+) -> Optional[Dict[str, Any]]:  # Returns the saved/updated devotional with its favorites
     """
     Saves (inserts or updates) a devotional entry and manages its associated favorite verses.
 
@@ -216,6 +782,7 @@ async def save_current_devotional(
     2. Updates the associated favorite verses in `devotional_favorite_verses`:
        - Removes verses no longer in the provided list for this devotional.
        - Adds verses from the list that aren't already associated.
+       - Adjusts the day's counts in `favorite_verse_daily` by the difference.
 
     Args:
         user_id: The ID of the user.
@@ -225,10 +792,20 @@ async def save_current_devotional(
                             for this specific devotional entry AFTER the save.
                             If None or empty, all existing favorites for this
                             devotional will be removed.
+        submitted_at: When the user submitted this content, by the app
+                      server's clock (now if not given). Stored with the
+                      entry, so writes are ordered by when their content was
+                      submitted, not by when they reach the database.
+        draft: Used by the autosave buffer. If the stored entry's content was
+               submitted at or after `submitted_at` (an explicit save, or a
+               newer draft flushed by another worker), nothing is written and
+               None is returned.
 
     Returns:
         A dictionary representing the newly created or updated devotional record
-        from the `devotionals` table.
+        from the `devotionals` table, with its `favorite_verses` as
+        get_current_devotional returns them, or None if a draft was skipped
+        as stale.
 
     Raises:
         Exception: Database errors or if the devotional record cannot be saved.
@@ -237,6 +814,7 @@ async def save_current_devotional(
     # Use a set to easily manage additions/deletions and ensure uniqueness
     current_favorite_ids = set(
         favorite_verse_ids) if favorite_verse_ids else set()
+    submitted_at = submitted_at or datetime.now(timezone.utc)
 
     async with db_connection() as conn:
         # Start a transaction to ensure all operations succeed or fail together
@@ -244,28 +822,40 @@ async def save_current_devotional(
             # === Step 1: Upsert the main devotional record ===
             upsert_devotional_query = """
                 INSERT INTO devotionals (
-                    user_id, devotional_date, reflection
+                    user_id, devotional_date, reflection, submitted_at
                 )
-                VALUES ($1, $2, $3)
+                VALUES ($1, $2, $3, $4)
                 ON CONFLICT (user_id, devotional_date)
                 DO UPDATE SET
                     reflection = EXCLUDED.reflection,
-                    updated_at = CURRENT_TIMESTAMP
+                    updated_at = CURRENT_TIMESTAMP,
+                    submitted_at = EXCLUDED.submitted_at
+                WHERE
+                    NOT $5::boolean
+                    OR devotionals.submitted_at IS NULL
+                    OR devotionals.submitted_at < EXCLUDED.submitted_at
                 RETURNING
                     devotional_id,
                     user_id,
                     devotional_date,
                     reflection,
                     created_at,
-                    updated_at;
+                    updated_at,
+                    (xmax = 0) AS inserted;
             """
             saved_devotional_record = await conn.fetchrow(
                 upsert_devotional_query,
                 user_id,
                 devotional_date,
-                reflection
+                reflection,
+                submitted_at,
+                draft
             )
 
+            if not saved_devotional_record and draft:
+                # A newer write won; this (stale) draft is dropped
+                return None
+
             if not saved_devotional_record:
                 # This should ideally not happen with RETURNING on success
                 raise Exception(
@@ -273,48 +863,28 @@ async def save_current_devotional(
 
             devotional_id = saved_devotional_record['devotional_id']
 
-            # === Step 2: Manage favorite verses for this devotional ===
-
-            # --- 2a: Remove favorite verses NOT in the current list ---
-            # Delete rows from devotional_favorite_verses for this devotional_id
-            # where the verse_id is NOT in the list we just received.
-            # Handle the case where current_favorite_ids is empty (delete all).
-            if current_favorite_ids:
-                # Use array parameter for NOT IN - $2::int[]
-                delete_query = """
-                    DELETE FROM devotional_favorite_verses
-                    WHERE devotional_id = $1 AND verse_id <> ALL ($2::int[]);
-                """
-                await conn.execute(delete_query, devotional_id, list(current_favorite_ids))
-            else:
-                # If the input list is empty, remove all associations for this devotional
-                delete_all_query = """
-                     DELETE FROM devotional_favorite_verses
-                     WHERE devotional_id = $1;
-                """
-                await conn.execute(delete_all_query, devotional_id)
-
-            # --- 2b: Add new favorite verses from the current list ---
-            # Attempt to insert all verse IDs provided.
-            # ON CONFLICT DO NOTHING handles verses that already exist efficiently.
-            if current_favorite_ids:
-                insert_query = """
-                    INSERT INTO devotional_favorite_verses (devotional_id, verse_id)
-                    VALUES ($1, $2)
-                    ON CONFLICT (devotional_id, verse_id) DO NOTHING;
-                """
-                # Prepare data for executemany or loop
-                # Using a loop with execute is often clear and sufficient unless performance profiling shows otherwise
-                for verse_id in current_favorite_ids:
-                    await conn.execute(insert_query, devotional_id, verse_id)
-                 # Alternative using executemany (might be slightly faster for very large lists):
-                 # data_to_insert = [(devotional_id, verse_id) for verse_id in current_favorite_ids]
-                 # await conn.executemany(insert_query, data_to_insert)
+            # === Step 1b: Keep the user's streak/count summary in step ===
+            # Only a new date changes it; editing an existing entry doesn't
+            if saved_devotional_record['inserted']:
+                appended = await conn.fetchval(
+                    DEVOTIONAL_STATS_APPEND_QUERY, user_id, devotional_date)
+                if appended is None:
+                    # Backfilled an earlier date: streaks can't be updated incrementally
+                    await conn.execute(DEVOTIONAL_STATS_REBUILD_QUERY, user_id)
+
+            # === Step 2: Sync favorite verses and the popular-verses counts ===
+            # One statement: drop favorites no longer listed (all of them for an
+            # empty list), add the new ones, and move the per-day counts by the
+            # difference. Re-saving the same list changes nothing.
+            favorite_verses = await conn.fetch(
+                FAVORITES_SYNC_QUERY, devotional_id, list(current_favorite_ids), devotional_date)
 
             # Transaction commits automatically if no exceptions were raised
 
-        # Return the main devotional data (not the favorite verses list itself)
-        return dict(saved_devotional_record)
+        saved_devotional = dict(saved_devotional_record)
+        del saved_devotional['inserted']
+        saved_devotional['favorite_verses'] = [dict(verse) for verse in favorite_verses]
+        return saved_devotional
 
 
 async def get_all_devotionals(
@@ -355,13 +925,13 @@ async def get_all_devotionals(
     if column_candidate in ALLOWED_SORT_COLUMNS and direction_candidate in ALLOWED_DIRECTIONS:
         safe_order_by_clause = f"{column_candidate} {direction_candidate}"
     else:
-        log.warning(
-            f"Invalid order_by parameter: '{order_by}'. Falling back to default: '{safe_order_by_clause}'.")
+        logger.warning(
+            "Invalid order_by parameter: %r. Falling back to default: %r.", order_by, safe_order_by_clause)
 
     safe_limit = max(0, limit)
     safe_offset = max(0, offset)
 
-    async with db_connection() as conn:
+    async with db_connection(readonly=True) as conn:
         devotionals_query = f"""
             SELECT
                 devotional_id,
@@ -1,21 +1,427 @@
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
 import asyncpg
 import os
+from collections import deque
+from typing import Optional
 from dotenv import load_dotenv
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
+from app.config import (
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_PLAN_BUFFER_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_REPLICA_RETRY_SECONDS,
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS,
+)
+from app.query_counter import count_connection, count_query, not_counted
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user@localhost:5432/bible_app")
+# Read replica for read-only queries; defaults to the primary when not configured
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", DATABASE_URL)
 
-# Function to get a database connection
+logger = logging.getLogger(__name__)
+
+# statement_timeout (ms) applied to connections borrowed in the current request;
+# set per route class by app/admission.py, None/0 keeps the server default
+statement_timeout_ms: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "statement_timeout_ms", default=None)
+
+# Ring buffer of the most recent EXPLAIN (ANALYZE, BUFFERS) captures for slow queries
+slow_query_plans = deque(maxlen=SLOW_QUERY_PLAN_BUFFER_SIZE)
+_explain_in_progress = False
+# Running plan captures; the event loop only keeps weak references to tasks
+_capture_tasks = set()
+
+
+def _param_shape(value) -> str:
+    """Describe a query parameter without leaking its value into the logs."""
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def _is_read_query(query: str) -> bool:
+    return query.lstrip().upper().startswith(("SELECT", "WITH"))
+
+
+async def _capture_plan(query: str, args: tuple, elapsed_ms: float):
+    """
+    Re-runs a slow read query under EXPLAIN (ANALYZE, BUFFERS) on a separate
+    connection and stores the plan in `slow_query_plans`.
+
+    Only one capture runs at a time so a burst of slow queries can't pile
+    extra load onto an already struggling database.
+    """
+    global _explain_in_progress
+    if _explain_in_progress:
+        return
+    _explain_in_progress = True
+    try:
+        # Plain connect: the capture itself must not go through the slow-query logger.
+        # Only read queries are captured, so explain them where reads are served.
+        conn = await asyncpg.connect(DATABASE_READ_URL)
+        try:
+            transaction = conn.transaction(readonly=True)
+            await transaction.start()
+            try:
+                plan = await conn.fetchval(
+                    "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, *args)
+            finally:
+                await transaction.rollback()
+        finally:
+            await conn.close()
+        slow_query_plans.append({
+            "captured_at": time.time(),
+            "query": " ".join(query.split()),
+            "params": [_param_shape(arg) for arg in args],
+            "duration_ms": round(elapsed_ms, 2),
+            "plan": json.loads(plan),
+        })
+    except Exception as e:
+        logger.warning("Failed to capture plan for slow query: %s", e)
+    finally:
+        _explain_in_progress = False
+
+
+def log_slow_query(record: asyncpg.connection.LoggedQuery):
+    """asyncpg query logger: logs queries over SLOW_QUERY_THRESHOLD_MS and samples their plans."""
+    elapsed_ms = record.elapsed * 1000
+    if elapsed_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    logger.warning(
+        "Slow query (%.1f ms): %s params=%s%s",
+        elapsed_ms,
+        " ".join(record.query.split()),
+        [_param_shape(arg) for arg in record.args],
+        f" error={type(record.exception).__name__}" if record.exception else "",
+    )
+
+    if (
+        SLOW_QUERY_EXPLAIN_SAMPLE_RATE > 0
+        and record.exception is None
+        and _is_read_query(record.query)
+        and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+    ):
+        task = asyncio.get_running_loop().create_task(
+            _capture_plan(record.query, tuple(record.args), elapsed_ms))
+        _capture_tasks.add(task)
+        task.add_done_callback(_capture_tasks.discard)
+
+
+class PoolTimeoutError(Exception):
+    """No pooled connection became free within DB_POOL_ACQUIRE_TIMEOUT_SECONDS."""
+
+
+# The database is too busy for this request: answered with 503 + Retry-After
+# (see app/main.py). QueryCanceledError is a statement_timeout firing.
+OVERLOAD_ERRORS = (PoolTimeoutError, asyncpg.QueryCanceledError)
+
+
+async def _acquire(pool):
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # Every connection is busy: the database is slow, not down. Fail this
+        # request fast (503, see app/main.py) instead of queueing behind it.
+        raise PoolTimeoutError(
+            f"No database connection free after {DB_POOL_ACQUIRE_TIMEOUT_SECONDS:g}s") from None
+    count_connection()
+    return conn
+
+
+class CountingConnection(asyncpg.Connection):
+    """
+    Adds every statement, and the rows it returned, to the current request's
+    counts (app/query_counter.py). That includes BEGIN/COMMIT, but not the
+    pool's reset on release. A cursor counts as one query, however many
+    batches it fetches.
+    """
+
+    async def reset(self, *, timeout=None):
+        with not_counted():
+            await super().reset(timeout=timeout)
+
+    async def execute(self, query, *args, timeout=None):
+        count_query()
+        return await super().execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command, args, *, timeout=None):
+        count_query()
+        return await super().executemany(command, args, timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None, record_class=None):
+        records = await super().fetch(query, *args, timeout=timeout, record_class=record_class)
+        count_query(len(records))
+        return records
+
+    async def fetchrow(self, query, *args, timeout=None, record_class=None):
+        record = await super().fetchrow(query, *args, timeout=timeout, record_class=record_class)
+        count_query(record is not None)
+        return record
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        value = await super().fetchval(query, *args, column=column, timeout=timeout)
+        # A NULL in the first row and no row at all look the same from here
+        count_query(value is not None)
+        return value
+
+    async def fetchmany(self, query, args, *, timeout=None, record_class=None):
+        records = await super().fetchmany(query, args, timeout=timeout, record_class=record_class)
+        count_query(len(records))
+        return records
+
+    def cursor(self, query, *args, prefetch=None, timeout=None, record_class=None):
+        count_query()
+        return super().cursor(query, *args, prefetch=prefetch, timeout=timeout, record_class=record_class)
+
+
+# Errors that mean the replica can't hand out a connection right now
+REPLICA_UNAVAILABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+)
+
+_write_pool = None
+_read_pool = None
+_replica_retry_at = 0.0
+_pool_lock = asyncio.Lock()
+
+
+async def _init_connection(conn):
+    conn.add_query_logger(log_slow_query)
+
+
+async def _create_pool(dsn: str):
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        init=_init_connection,
+        connection_class=CountingConnection,
+    )
+
+
+async def init_pools():
+    """
+    Opens the primary (write) pool and, when DATABASE_READ_URL points elsewhere,
+    the replica (read) pool. An unreachable replica is not fatal: reads use the
+    primary until it comes back.
+    """
+    global _write_pool, _read_pool, _replica_retry_at
+    async with _pool_lock:
+        if _write_pool is None:
+            _write_pool = await _create_pool(DATABASE_URL)
+        if (
+            _read_pool is None
+            and DATABASE_READ_URL != DATABASE_URL
+            and time.monotonic() >= _replica_retry_at
+        ):
+            try:
+                _read_pool = await _create_pool(DATABASE_READ_URL)
+            except REPLICA_UNAVAILABLE_ERRORS as e:
+                _replica_retry_at = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+                logger.warning("Read replica unavailable, reading from the primary: %s", e)
+
+
+async def close_pools():
+    global _write_pool, _read_pool
+    async with _pool_lock:
+        for pool in (_read_pool, _write_pool):
+            if pool is not None:
+                await pool.close()
+        _write_pool = None
+        _read_pool = None
+
+
+# Errors that mean a replica connection broke under us: dropped, or the server
+# restarting / in recovery. Only the connection is at fault, so a read that hit
+# one on its first statement is safe to run again on the primary.
+REPLICA_LOST_ERRORS = (
+    asyncpg.ConnectionDoesNotExistError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.AdminShutdownError,
+    asyncpg.InterfaceError,
+)
+
+
+def _mark_replica_down(e: Exception):
+    global _replica_retry_at
+    _replica_retry_at = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    logger.warning("Read replica unavailable, reading from the primary: %s", e)
+
+
+async def _set_statement_timeout(conn):
+    timeout_ms = statement_timeout_ms.get()
+    if timeout_ms:
+        # Per-connection overhead: counted with the connection, not as a query
+        with not_counted():
+            await conn.execute(f"SET statement_timeout = {int(timeout_ms)}")
+
+
+class _ReplicaConnection:
+    """
+    A replica connection that moves to the primary if its first statement (or
+    the BEGIN of a first transaction) finds the replica gone. Nothing has been
+    read at that point, so the statement simply runs again there. Later
+    failures are the caller's: half a result can't be retried transparently.
+    Everything else is passed through to the asyncpg connection.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._settled = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def _run(self, call):
+        if self._settled:
+            return await call(self._conn)
+        try:
+            result = await call(self._conn)
+        except REPLICA_LOST_ERRORS as e:
+            _mark_replica_down(e)
+            await self._pool.release(self._conn)
+            self._pool, self._conn = _write_pool, await _acquire(_write_pool)
+            await _set_statement_timeout(self._conn)
+            result = await call(self._conn)
+        finally:
+            self._settled = True
+        return result
+
+    async def execute(self, *args, **kwargs):
+        return await self._run(lambda conn: conn.execute(*args, **kwargs))
+
+    async def executemany(self, *args, **kwargs):
+        return await self._run(lambda conn: conn.executemany(*args, **kwargs))
+
+    async def fetch(self, *args, **kwargs):
+        return await self._run(lambda conn: conn.fetch(*args, **kwargs))
+
+    async def fetchrow(self, *args, **kwargs):
+        return await self._run(lambda conn: conn.fetchrow(*args, **kwargs))
+
+    async def fetchval(self, *args, **kwargs):
+        return await self._run(lambda conn: conn.fetchval(*args, **kwargs))
+
+    async def fetchmany(self, *args, **kwargs):
+        return await self._run(lambda conn: conn.fetchmany(*args, **kwargs))
+
+    def transaction(self, **kwargs):
+        return _ReplicaTransaction(self, kwargs)
+
+    async def release(self):
+        await self._pool.release(self._conn)
+
+
+class _ReplicaTransaction:
+    """conn.transaction() for a _ReplicaConnection: BEGIN is its first statement."""
+
+    def __init__(self, conn: _ReplicaConnection, kwargs: dict):
+        self._conn = conn
+        self._kwargs = kwargs
+        self._transaction = None
+
+    async def __aenter__(self):
+        async def begin(conn):
+            transaction = conn.transaction(**self._kwargs)
+            await transaction.start()
+            return transaction
+        self._transaction = await self._conn._run(begin)
+        return self._transaction
+
+    async def __aexit__(self, *exc_info):
+        return await self._transaction.__aexit__(*exc_info)
+
+
+async def _acquire_read_connection() -> Optional[_ReplicaConnection]:
+    """A connection to the replica, with the request's statement_timeout, or None if it is unavailable."""
+    if DATABASE_READ_URL == DATABASE_URL or time.monotonic() < _replica_retry_at:
+        return None
+    if _read_pool is None:
+        await init_pools()
+        if _read_pool is None:
+            return None
+    pool = _read_pool
+    try:
+        conn = await _acquire(pool)
+    except REPLICA_UNAVAILABLE_ERRORS as e:
+        _mark_replica_down(e)
+        return None
+    try:
+        await _set_statement_timeout(conn)
+    except REPLICA_LOST_ERRORS as e:
+        _mark_replica_down(e)
+        await pool.release(conn)
+        return None
+    except BaseException:
+        await pool.release(conn)
+        raise
+    return _ReplicaConnection(pool, conn)
+
+
+# Function to get a standalone database connection (outside the pools)
 async def get_db_connection():
-    return await asyncpg.connect(DATABASE_URL)
+    conn = await asyncpg.connect(DATABASE_URL)
+    conn.add_query_logger(log_slow_query)
+    return conn
 
 # Context manager for database connections
 @asynccontextmanager
-async def db_connection():
-    conn = await get_db_connection()
+async def db_connection(readonly: bool = False):
+    """
+    Borrows a pooled connection.
+
+    readonly=True routes to the read replica, falling back to the primary if it
+    is down, or if the connection turns out to be broken on its first statement
+    (see _ReplicaConnection). Writes, and reads that must see a write that just
+    happened, use the default primary connection.
+
+    Raises PoolTimeoutError if no connection frees up within
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS. If the request has a statement_timeout_ms,
+    it is SET on the connection; the pool's RESET ALL on release undoes it.
+    """
+    replica = await _acquire_read_connection() if readonly else None
+    if replica is not None:
+        try:
+            yield replica
+        finally:
+            await replica.release()
+        return
+
+    if _write_pool is None:
+        await init_pools()
+    pool = _write_pool
+    conn = await _acquire(pool)
     try:
+        await _set_statement_timeout(conn)
         yield conn
     finally:
-        await conn.close()
\ No newline at end of file
+        await pool.release(conn)
+
+
+async def for_each_pooled_connection(callback, readonly: bool = False):
+    """
+    Runs `await callback(conn)` on DB_POOL_MIN_SIZE connections held at once,
+    i.e. on every connection the pool opened at startup. Used by warmup to
+    fill each connection's statement cache.
+    """
+    async with AsyncExitStack() as stack:
+        connections = [
+            await stack.enter_async_context(db_connection(readonly=readonly))
+            for _ in range(DB_POOL_MIN_SIZE)
+        ]
+        await asyncio.gather(*(callback(conn) for conn in connections))
@@ -0,0 +1,51 @@
+# app/disconnect.py
+"""
+Stop database work when the client has gone away.
+
+    results = await until_disconnected(request, search_bible_text(query, limit))
+
+runs the call as a task and checks request.is_disconnected() every
+DISCONNECT_POLL_SECONDS. If the client disconnects first, the task is
+cancelled: asyncpg then sends a cancel request for the running statement, so
+an abandoned search stops using the backend and its connection goes back to
+the pool. (Single-flight reads only stop once every caller sharing them is
+gone.) ClientDisconnected is answered with a 499 nobody will read, which
+shows up as such in the access log.
+
+Calls served by the SQLite backend run in a worker thread and finish anyway;
+only waiting on them is abandoned.
+"""
+import asyncio
+import logging
+from fastapi import Request
+from app.config import DISCONNECT_POLL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# nginx's "client closed request"
+CLIENT_CLOSED_REQUEST = 499
+
+counters = {"cancelled": 0}
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def until_disconnected(request: Request, awaitable):
+    """Result of `awaitable`, unless the client disconnects first (ClientDisconnected)."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                counters["cancelled"] += 1
+                logger.info("Client disconnected, cancelling %s %s", request.method, request.url.path)
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let the cancellation (and asyncpg's cancel request) go through before returning
+            await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,259 @@
+# app/launcher.py
+"""
+Production launcher: preload once, fork workers that share it.
+
+    python -m app.launcher --host 0.0.0.0 --port 8000 --workers 4
+
+Instead of `uvicorn --workers N` (N processes that each import the app and
+build their own copies of the scripture caches), the parent process
+
+1. imports the app and runs the LAUNCHER_PRELOAD cache warmers once
+   (book resolver, related-verses index, typeahead), pages the SQLite
+   scripture file into the OS page cache, then closes its pools;
+2. gc.freeze()s everything it has built, so workers' garbage collections
+   don't touch, and so copy, those pages;
+3. binds the listening socket and forks WEB_WORKERS uvicorn workers.
+
+Workers share the parent's memory copy-on-write. The file-backed data
+(the SQLite file and related_verses.bin, both memory-mapped) is shared
+through the page cache whatever happens. /admin/process shows one worker's
+memory; the parent logs every worker's every LAUNCHER_MEMORY_REPORT_SECONDS
+(pss splits shared pages between the processes using them; private_mb is
+what the worker alone costs).
+
+Recycling is graceful: a replacement is forked first, then the old worker
+gets SIGTERM and finishes its requests (uvicorn's graceful shutdown, which
+also flushes autosave drafts) within LAUNCHER_GRACEFUL_TIMEOUT_SECONDS.
+Workers are recycled after about LAUNCHER_MAX_REQUESTS requests, when their
+private memory passes LAUNCHER_MAX_WORKER_MEMORY_MB, or all of them on
+SIGHUP. SIGTERM / SIGINT stop everything. Linux only (fork and
+/proc).
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict
+import uvicorn
+from app.config import (
+    WEB_WORKERS,
+    LAUNCHER_PRELOAD,
+    LAUNCHER_MAX_REQUESTS,
+    LAUNCHER_MAX_WORKER_MEMORY_MB,
+    LAUNCHER_MEMORY_REPORT_SECONDS,
+    LAUNCHER_GRACEFUL_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# A worker that exits sooner than this after starting is treated as crashing
+MIN_WORKER_LIFETIME_SECONDS = 5
+# Extra time given to a retiring worker beyond its graceful shutdown before SIGKILL
+KILL_GRACE_SECONDS = 5
+
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def process_memory(pid="self") -> dict:
+    """Memory of a process in MB from /proc ({} if unavailable)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in _SMAPS_FIELDS:
+                    values[name] = int(rest.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(values.get("Rss", 0), 1),
+        "pss_mb": round(values.get("Pss", 0), 1),
+        "shared_mb": round(values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0), 1),
+        "private_mb": round(values.get("Private_Clean", 0) + values.get("Private_Dirty", 0), 1),
+    }
+
+
+class Launcher:
+    def __init__(self, app, sock: socket.socket, workers: int):
+        self.app = app
+        self.sock = sock
+        self.worker_count = workers
+        # pid -> start time (monotonic)
+        self.workers: Dict[int, float] = {}
+        # pid -> when it was asked to stop
+        self.retiring: Dict[int, float] = {}
+        self.stopping = False
+        self.restart_requested = False
+
+    # --- worker side ---
+
+    def _run_worker(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+        config = uvicorn.Config(
+            self.app,
+            lifespan="on",
+            # Logging is already set up (app/logging_setup.py), with its own access log
+            log_config=None,
+            access_log=False,
+            limit_max_requests=LAUNCHER_MAX_REQUESTS or None,
+            # Spread recycling out so workers don't all restart together
+            limit_max_requests_jitter=LAUNCHER_MAX_REQUESTS // 10,
+            timeout_graceful_shutdown=LAUNCHER_GRACEFUL_TIMEOUT_SECONDS,
+        )
+        uvicorn.Server(config).run(sockets=[self.sock])
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("Worker %s failed", os.getpid())
+                code = 1
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        logger.info("Started worker %s", pid)
+
+    # --- parent side ---
+
+    def recycle(self, pid: int, reason: str):
+        """Starts a replacement, then lets `pid` finish its requests and exit."""
+        if pid in self.retiring or pid not in self.workers:
+            return
+        logger.info("Recycling worker %s: %s", pid, reason)
+        self.spawn()
+        self.retiring[pid] = time.monotonic()
+        self._signal(pid, signal.SIGTERM)
+
+    @staticmethod
+    def _signal(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            retired = self.retiring.pop(pid, None) is not None
+            if started is None or retired or self.stopping:
+                continue
+            # Exited by itself: reached its request limit, or crashed
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+                logger.error("Worker %s exited early (code %s); restarting in 1s", pid, code)
+                time.sleep(1)
+            else:
+                logger.info("Worker %s exited (code %s); starting a replacement", pid, code)
+            self.spawn()
+
+    def _kill_overdue(self):
+        deadline = LAUNCHER_GRACEFUL_TIMEOUT_SECONDS + KILL_GRACE_SECONDS
+        for pid, since in list(self.retiring.items()):
+            if time.monotonic() - since > deadline:
+                logger.warning("Worker %s did not stop in %ss; killing it", pid, deadline)
+                self._signal(pid, signal.SIGKILL)
+
+    def report_memory(self):
+        for pid in list(self.workers):
+            memory = process_memory(pid)
+            if not memory:
+                continue
+            logger.info("Worker %s memory: %s", pid, memory, extra={"worker_pid": pid, **memory})
+            if (LAUNCHER_MAX_WORKER_MEMORY_MB
+                    and memory["private_mb"] > LAUNCHER_MAX_WORKER_MEMORY_MB):
+                self.recycle(pid, f"private memory {memory['private_mb']} MB "
+                                  f"> {LAUNCHER_MAX_WORKER_MEMORY_MB:g} MB")
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_restart(self, signum, frame):
+        self.restart_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_restart)
+
+        for _ in range(self.worker_count):
+            self.spawn()
+        logger.info("Parent %s memory: %s", os.getpid(), process_memory())
+
+        next_report = time.monotonic() + LAUNCHER_MEMORY_REPORT_SECONDS
+        while not self.stopping:
+            time.sleep(0.5)
+            self._reap()
+            self._kill_overdue()
+            if self.restart_requested:
+                self.restart_requested = False
+                # Each replacement is forked before its predecessor is asked to stop
+                for pid in [pid for pid in self.workers if pid not in self.retiring]:
+                    self.recycle(pid, "SIGHUP")
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + LAUNCHER_MEMORY_REPORT_SECONDS
+                self.report_memory()
+
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Stopping %d workers", len(self.workers))
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + LAUNCHER_GRACEFUL_TIMEOUT_SECONDS + KILL_GRACE_SECONDS
+        while self.workers and time.monotonic() < deadline:
+            time.sleep(0.2)
+            self._reap()
+        for pid in self.workers:
+            logger.warning("Worker %s did not stop in time; killing it", pid)
+            self._signal(pid, signal.SIGKILL)
+        self.sock.close()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with preloaded, shared scripture data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    args = parser.parse_args()
+
+    from app.main import app
+    from app.warmup import preload
+
+    started = time.monotonic()
+    names = {name.strip() for name in LAUNCHER_PRELOAD.split(",") if name.strip()}
+    asyncio.run(preload(names))
+    # Everything built so far is long-lived: keep the collector from touching (and copying) it
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded in %.2fs", time.monotonic() - started)
+
+    Launcher(app, bind_socket(args.host, args.port), args.workers).run()
+
+
+if __name__ == "__main__":
+    main()
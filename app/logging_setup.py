@@ -0,0 +1,212 @@
+# app/logging_setup.py
+"""
+Structured, non-blocking logging.
+
+setup_logging() puts a single QueueHandler on the root logger: a log call on
+the event loop only formats the message and puts the record on a bounded
+queue. A QueueListener thread writes the records to stderr, one JSON object
+(or text line) per record. If the writer falls behind by LOG_QUEUE_SIZE
+records, new ones are dropped and counted instead of blocking requests.
+
+Every record made while a request is being handled carries its request id
+(X-Request-ID from the client, or a new one; echoed in the response).
+RequestLoggingMiddleware writes one access record per request with its
+status and duration_ms. Per-prefix LOG_SAMPLE_RATES thin out high-volume
+routes; slow requests and 5xx responses are always logged. Extra fields
+passed with `extra={...}` appear as keys in the JSON output.
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from typing import List, Optional, Tuple
+from app.config import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES, LOG_SLOW_REQUEST_MS
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+access_logger = logging.getLogger("app.access")
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+                         defaults={"request_id": None})
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve everything that can't cross to the writer thread (args, traceback)
+        # but leave the formatting proper to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room: stopping must not fail just because the queue is full
+        self.queue.put(self._sentinel)
+
+
+_queue_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[_QueueListener] = None
+_fork_hook_registered = False
+
+
+def setup_logging(stream=None):
+    """Routes all logging through the queue (written to `stream`, default stderr); safe to call more than once."""
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(RequestIdFilter())
+    _listener = _QueueListener(_queue_handler.queue, stream_handler)
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(LOG_LEVEL)
+    _listener.start()
+    global _fork_hook_registered
+    if not _fork_hook_registered:
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        _fork_hook_registered = True
+
+
+def _restart_after_fork():
+    # The writer thread doesn't survive fork (see app/launcher.py): give the
+    # child its own queue and thread, writing to the same handlers
+    global _listener
+    if _listener is None or _queue_handler is None:
+        return
+    _queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler.dropped = 0
+    _listener = _QueueListener(_queue_handler.queue, *_listener.handlers)
+    _listener.start()
+
+
+def stop_logging():
+    """Writes out everything still queued; later records are written directly (blocking)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
+
+
+def logging_stats() -> dict:
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+    }
+
+
+def parse_sample_rates(spec: str) -> List[Tuple[str, float]]:
+    """ "/typeahead=0.01,/verses=0.1" -> [("/typeahead", 0.01), ("/verses", 0.1)], longest prefix first."""
+    rates = []
+    for item in spec.split(","):
+        if "=" in item:
+            prefix, rate = item.split("=", 1)
+            rates.append((prefix.strip(), min(1.0, max(0.0, float(rate)))))
+    return sorted(rates, key=lambda pair: len(pair[0]), reverse=True)
+
+
+_sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def sample_rate(path: str) -> float:
+    for prefix, rate in _sample_rates:
+        if path.startswith(prefix):
+            return rate
+    return 1.0
+
+
+class RequestLoggingMiddleware:
+    """ASGI middleware: request id, X-Request-ID response header and a sampled access record."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            path = scope["path"]
+            if status >= 500 or duration_ms >= LOG_SLOW_REQUEST_MS or random.random() < sample_rate(path):
+                access_logger.info(
+                    "%s %s %d", scope["method"], path, status,
+                    extra={"status": status, "duration_ms": round(duration_ms, 2)})
+            request_id_var.reset(token)
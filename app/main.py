@@ -1,9 +1,23 @@
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import verses, auth, devotionals
+from app.routes import verses, auth, devotionals, admin, typeahead, verse_of_day, books
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from app import limiter
+from app.database import close_pools, OVERLOAD_ERRORS
+from app.disconnect import ClientDisconnected, CLIENT_CLOSED_REQUEST
+from app.admission import AdmissionControlMiddleware, retry_after_headers
+from app.autosave import autosave_buffer
+from app.scheduler import scheduler
+from app.warmup import run_warmup, is_ready, warmup_state
+from app.logging_setup import setup_logging, stop_logging, RequestLoggingMiddleware
+from app.query_counter import QueryCounterMiddleware
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Bible API", description="API for accessing Bible verses and chapters")
 
@@ -17,6 +31,9 @@ app = FastAPI(title="Bible API", description="API for accessing Bible verses and
 
 app.state.limiter = limiter
 
+# Admission control sits inside rate limiting: only allowed requests take a slot
+app.add_middleware(AdmissionControlMiddleware)
+
 # Add SlowAPIMiddleware for global rate limiting
 app.add_middleware(SlowAPIMiddleware)
 
@@ -29,21 +46,63 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Per-request database counts (X-DB-* headers with DEBUG_DB_HEADERS)
+app.add_middleware(QueryCounterMiddleware)
+
+# Outermost: request ids and access records cover everything below, including shed requests
+app.add_middleware(RequestLoggingMiddleware)
+
 app.include_router(verses.router)
+app.include_router(typeahead.router, tags=["typeahead"])
+app.include_router(verse_of_day.router, tags=["verses"])
+app.include_router(books.router, tags=["books"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(devotionals.router, tags=["devotionals"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
+
+# Readiness probe for load balancers: 503 until startup warmup has finished
+@app.get("/ready", tags=["health"])
+@limiter.exempt
+async def ready():
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming_up", **warmup_state})
+    return {"status": "ready", **warmup_state}
 
 # Handle rate limit exceeded error
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_error(request, exc):
     return HTTPException(status_code=429, detail="Rate limit exceeded. Please try again later.")
 
+# No pooled connection freed up in time, or a statement hit its route's
+# statement_timeout: shed the request rather than let it queue
+async def database_overload_error(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry shortly."},
+                        headers=retry_after_headers())
+
+for overload_error in OVERLOAD_ERRORS:
+    app.add_exception_handler(overload_error, database_overload_error)
+
+# The client went away while its query ran; the query has been cancelled
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected(request, exc):
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
 # Use app.add_event_handler instead of on_event for startup and shutdown
 async def startup():
-    print("App starting up...")
+    logger.info("App starting up")
+    # Warm up in the background so /ready can answer (503) while it runs
+    app.state.warmup_task = asyncio.create_task(run_warmup())
+    autosave_buffer.start()
+    scheduler.start()
 
 async def shutdown():
-    print("App shutting down...")
+    logger.info("App shutting down")
+    app.state.warmup_task.cancel()
+    await scheduler.stop()
+    # Buffered autosave drafts must reach the database before the pools close
+    await autosave_buffer.close()
+    await close_pools()
+    stop_logging()
 
 # Register event handlers explicitly
 app.add_event_handler("startup", startup)
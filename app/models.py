@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class UserInDB(BaseModel):
@@ -54,3 +54,25 @@ class Devotional(BaseModel):
     favorite_verses: Optional[List[FavoriteVerse]] = []
     created_at: datetime
     updated_at: datetime
+
+
+class DevotionalSearchHit(BaseModel):
+    devotional_id: int
+    devotional_date: date
+    rank: float
+    snippet: str
+
+
+class DevotionalSearchPage(BaseModel):
+    results: List[DevotionalSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class DevotionalStats(BaseModel):
+    total_entries: int
+    current_streak: int
+    longest_streak: int
+    first_entry_date: Optional[date] = None
+    last_entry_date: Optional[date] = None
+    # "YYYY-MM" -> number of devotionals written that month
+    monthly_counts: Dict[str, int]
@@ -0,0 +1,56 @@
+# app/popular_verses.py
+"""
+Most favorited verses per time window.
+
+Counts come from favorite_verse_daily, which save_current_devotional keeps
+current in its own transaction, so a window is a sum over at most a year of
+small per-day rows instead of a scan of every favorite. Each window's top
+POPULAR_VERSES_TOP_K is cached in memory for POPULAR_VERSES_CACHE_SECONDS,
+and concurrent misses for the same window share one query.
+
+Only verses and aggregate counts leave this module: no users, devotionals
+or reflections, and a verse is only listed once POPULAR_VERSES_MIN_USERS
+different users have favorited it in the window (the same user favoriting
+it on several days counts once).
+"""
+from typing import List
+from app.cache import TTLCache
+from app.config import POPULAR_VERSES_TOP_K, POPULAR_VERSES_MIN_USERS, POPULAR_VERSES_CACHE_SECONDS
+from app.crud import get_popular_verses as fetch_popular_verses, get_verses_by_ids
+from app.singleflight import single_flight
+
+# window name -> days, today included
+WINDOWS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+_top_k = TTLCache(len(WINDOWS), POPULAR_VERSES_CACHE_SECONDS)
+counters = {"hits": 0, "misses": 0}
+
+
+@single_flight("popular_verses")
+async def _load(window: str) -> List[dict]:
+    popular = await fetch_popular_verses(
+        WINDOWS[window], POPULAR_VERSES_MIN_USERS, POPULAR_VERSES_TOP_K)
+    if not popular:
+        return []
+    verses = {verse["id"]: verse for verse in await get_verses_by_ids([p["verse_id"] for p in popular])}
+    return [
+        {**verses[p["verse_id"]], "favorites": p["favorites"]}
+        for p in popular
+        if p["verse_id"] in verses
+    ]
+
+
+async def get_popular_verses(window: str) -> List[dict]:
+    """The window's top verses, most favorited first (shared list: do not mutate)."""
+    cached = _top_k.get(window)
+    if cached is not None:
+        counters["hits"] += 1
+        return cached
+    counters["misses"] += 1
+    popular = await _load(window)
+    _top_k.set(window, popular)
+    return popular
+
+
+def stats() -> dict:
+    return {"windows": len(_top_k), "ttl_seconds": _top_k.ttl, **counters}
@@ -0,0 +1,115 @@
+# app/query_counter.py
+"""
+Per-request database round trips.
+
+QueryCounterMiddleware gives every request a fresh QueryCounts. While the
+request is handled, the database layer adds to it: each pooled connection
+borrowed (app/database.py), each statement sent on one (CountingConnection),
+and the rows those statements returned. Calls to the SQLite scripture backend
+count as one query each, with no connection. Per-connection overhead (the
+statement_timeout SET and the pool's reset on release) isn't counted as
+queries: it comes with every connection, which is already counted.
+
+With DEBUG_DB_HEADERS on, the counts go out as X-DB-Connections, X-DB-Queries
+and X-DB-Rows response headers; app/testing.py turns them into per-endpoint
+query budgets. Work done outside a request (warmup, scheduled jobs, the
+autosave flush) isn't counted.
+
+A single-flight read (app/singleflight.py) runs once for every caller
+waiting on it. It is counted on its own, and each of those callers' requests
+gets the full count, as if it had run the read itself. Totals across
+requests can therefore exceed what the database actually served.
+"""
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+from app.config import DEBUG_DB_HEADERS
+
+
+@dataclass
+class QueryCounts:
+    connections: int = 0
+    queries: int = 0
+    rows: int = 0
+
+    def headers(self) -> list:
+        return [
+            (b"x-db-connections", str(self.connections).encode()),
+            (b"x-db-queries", str(self.queries).encode()),
+            (b"x-db-rows", str(self.rows).encode()),
+        ]
+
+
+# Read on every response, so tests can switch the headers on (see app/testing.py)
+expose_headers = DEBUG_DB_HEADERS
+
+_counts: contextvars.ContextVar[Optional[QueryCounts]] = contextvars.ContextVar("query_counts", default=None)
+
+
+def current_counts() -> Optional[QueryCounts]:
+    """The current request's counts, or None outside a request."""
+    return _counts.get()
+
+
+def count_connection():
+    counts = _counts.get()
+    if counts is not None:
+        counts.connections += 1
+
+
+def count_query(rows: int = 0):
+    counts = _counts.get()
+    if counts is not None:
+        counts.queries += 1
+        counts.rows += rows
+
+
+def add_counts(counts: QueryCounts):
+    """Adds work done on the current request's behalf elsewhere (a shared single-flight call)."""
+    current = _counts.get()
+    if current is not None:
+        current.connections += counts.connections
+        current.queries += counts.queries
+        current.rows += counts.rows
+
+
+async def counted_in(counts: QueryCounts, awaitable):
+    """Awaits `awaitable` with its database work counted in `counts` instead of the current request."""
+    _counts.set(counts)
+    return await awaitable
+
+
+@contextmanager
+def not_counted():
+    """Statements made inside don't count towards the current request."""
+    token = _counts.set(None)
+    try:
+        yield
+    finally:
+        _counts.reset(token)
+
+
+class QueryCounterMiddleware:
+    """ASGI middleware: counts each request's database work, sent as headers if DEBUG_DB_HEADERS."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counts = QueryCounts()
+        token = _counts.set(counts)
+
+        async def send_with_counts(message):
+            if message["type"] == "http.response.start" and expose_headers:
+                message["headers"] = [*message.get("headers", []), *counts.headers()]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_counts)
+        finally:
+            _counts.reset(token)
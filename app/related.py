@@ -0,0 +1,88 @@
+# app/related.py
+"""
+"Verses like this one" from a precomputed neighbor table.
+
+bible-data/buildRelated.py computes TF-IDF similarities offline and writes the
+top-k neighbors of every verse to RELATED_VERSES_PATH. Here the file is
+memory-mapped read-only and answered with a binary search over verse ids: no
+numpy, no similarity work per request, and the pages are shared by every
+worker through the OS page cache.
+
+File layout (little-endian):
+    header      magic b"RELV", version u32, k u32, count u32
+    ids         int32[count]       verse ids, ascending
+    neighbors   int32[count * k]   neighbor verse ids, best first, 0 = none
+    scores      float32[count * k] cosine similarity of each neighbor
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+from app.config import RELATED_VERSES_PATH
+from app.warmup import register_warmer
+
+logger = logging.getLogger(__name__)
+
+RELATED_MAGIC = b"RELV"
+RELATED_VERSION = 1
+HEADER_FORMAT = "<4sIII"
+
+
+class RelatedIndex:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.k, self.count = struct.unpack_from(HEADER_FORMAT, self._mmap)
+        if magic != RELATED_MAGIC or version != RELATED_VERSION:
+            raise ValueError(f"{path} is not a version {RELATED_VERSION} related-verses file")
+
+        offset = struct.calcsize(HEADER_FORMAT)
+        sections = []
+        for typecode, length in (("i", self.count), ("i", self.count * self.k), ("f", self.count * self.k)):
+            size = length * 4
+            view = memoryview(self._mmap)[offset:offset + size]
+            if sys.byteorder == "little":
+                sections.append(view.cast(typecode))
+            else:
+                # Big-endian host: private byte-swapped copy instead of the shared mapping
+                values = array(typecode, view)
+                values.byteswap()
+                sections.append(values)
+            offset += size
+        self.ids, self.neighbors, self.scores = sections
+
+    def related(self, verse_id: int, k: int) -> Optional[List[tuple]]:
+        """Up to k (verse id, score) pairs, most similar first; None if the verse isn't indexed."""
+        index = bisect_left(self.ids, verse_id)
+        if index == self.count or self.ids[index] != verse_id:
+            return None
+        start = index * self.k
+        return [
+            (self.neighbors[i], self.scores[i])
+            for i in range(start, start + min(k, self.k))
+            if self.neighbors[i]
+        ]
+
+
+_index: Optional[RelatedIndex] = None
+
+
+def get_related_index() -> Optional[RelatedIndex]:
+    """The loaded neighbor table, or None if it is missing or not loaded yet."""
+    return _index
+
+
+@register_warmer("related_verses")
+async def load_related_index():
+    global _index
+    if not os.path.exists(RELATED_VERSES_PATH):
+        logger.warning("No related-verses file at %s; run bible-data/buildRelated.py",
+                       RELATED_VERSES_PATH)
+        return
+    _index = RelatedIndex(RELATED_VERSES_PATH)
+    logger.info("Loaded related verses for %d verses (top %d)", _index.count, _index.k)
@@ -0,0 +1,79 @@
+# app/response_format.py
+"""
+Compact responses for the verse routes.
+
+    fields=verse_number,text    only these fields
+    format=columns              {"count": n, "columns": {field: [values...]}}
+                                instead of a list of objects
+    Accept: application/msgpack MessagePack instead of JSON
+
+Requests that use none of these get the usual response_model JSON. msgpack
+is optional: without it installed, MessagePack requests are answered in JSON.
+Either way the body depends on Accept, so routes that offer these add the
+vary_on_accept dependency and every response they send carries Vary: Accept.
+"""
+import json
+from decimal import Decimal
+from typing import List, Optional, Sequence
+from fastapi import HTTPException, Request, Response
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _encode_default(value):
+    # ILIKE search ranks come back from Postgres as numeric
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """Validated, de-duplicated field list from a `fields=` value (None if not given)."""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if not names or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s) {', '.join(unknown) or '(none given)'}; "
+                   f"available: {', '.join(allowed)}")
+    return names
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def is_shaped(request: Request, fields: Optional[str], layout: Optional[str]) -> bool:
+    """True if the request asked for anything other than the default JSON objects."""
+    return fields is not None or layout == "columns" or wants_msgpack(request)
+
+
+def shape_rows(rows: List[dict], fields: Sequence[str], columnar: bool):
+    if columnar:
+        return {"count": len(rows), "columns": {field: [row[field] for row in rows] for field in fields}}
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def vary_on_accept(response: Response):
+    """Route dependency: the default JSON response also says it varies by Accept."""
+    response.headers["Vary"] = "Accept"
+
+
+def render(request: Request, content) -> Response:
+    headers = {"Vary": "Accept"}
+    if wants_msgpack(request):
+        return Response(
+            content=msgpack.packb(content, use_bin_type=True, default=_encode_default),
+            media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return Response(
+        content=json.dumps(content, separators=(",", ":"), ensure_ascii=False,
+                           default=_encode_default).encode(),
+        media_type="application/json", headers=headers)
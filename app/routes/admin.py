@@ -0,0 +1,72 @@
+# app/routes/admin.py
+from fastapi import APIRouter, HTTPException, Header, Depends, status
+from typing import Optional
+from app.config import ADMIN_TOKEN, SLOW_QUERY_THRESHOLD_MS
+from app.database import slow_query_plans
+from app.cache import negative_cache
+from app.singleflight import read_flights
+from app.autosave import autosave_buffer
+from app import popular_verses
+from app.scheduler import scheduler
+from app.admission import admission_stats
+from app.disconnect import counters as disconnect_counters
+from app.logging_setup import logging_stats
+from app.launcher import process_memory
+from app.warmup import warmup_state
+import os
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Guards the operational endpoints. They are disabled entirely unless
+    ADMIN_TOKEN is configured.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/slow-queries", summary="Most recent EXPLAIN plans captured for slow queries")
+async def read_slow_queries():
+    # Newest first
+    return {
+        "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "plans": list(reversed(slow_query_plans)),
+    }
+
+
+@router.get("/caches", summary="Cache sizes, per-endpoint hit counters, coalesced reads, autosave buffer and popular verses")
+async def read_cache_stats():
+    return {
+        "negative": negative_cache.stats(),
+        "single_flight": read_flights.stats(),
+        "autosave": autosave_buffer.stats(),
+        "popular_verses": popular_verses.stats(),
+    }
+
+
+@router.get("/jobs", summary="Background scheduler jobs: durations, failures, leadership")
+async def read_job_stats():
+    return scheduler.stats()
+
+
+@router.get("/admission", summary="Per-route-class concurrency, shed requests and queries cancelled on disconnect")
+async def read_admission_stats():
+    return {
+        "classes": admission_stats(),
+        "cancelled_on_disconnect": disconnect_counters["cancelled"],
+    }
+
+
+@router.get("/logging", summary="Log records waiting for the writer thread and records dropped")
+async def read_logging_stats():
+    return logging_stats()
+
+
+@router.get("/process", summary="This worker's memory (shared vs private) and what it inherited preloaded")
+async def read_process_stats():
+    return {"pid": os.getpid(), "memory": process_memory(), "preloaded": warmup_state["preloaded"]}
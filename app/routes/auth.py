@@ -7,9 +7,11 @@ from datetime import timedelta
 from app.config import SECRET_KEY, ALGORITHM
 from app import limiter
 from app.utils import get_current_user_from_cookie
+import logging
 
 # --- Define your existing router ---
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Existing /register endpoint ---
 @router.post("/register", response_model=User)
@@ -96,7 +98,7 @@ async def logout_user(request: Request, response: JSONResponse = JSONResponse(co
     """
     Logs the user out by clearing the access_token cookie.
     """
-    print("Attempting to clear access_token cookie...") # Debugging line
+    logger.debug("Clearing access_token cookie")
     # Tell the browser to delete the cookie by setting its expiry to the past (Max-Age=0)
     # IMPORTANT: Ensure 'path' and 'domain' (if used) match how the cookie was set during login.
     response = JSONResponse(content={"message": "Logout successful"})
@@ -0,0 +1,86 @@
+# app/routes/books.py
+from fastapi import APIRouter, HTTPException, Path, Request, Response
+from app import limiter
+from app.book_resolver import get_book_resolver
+from app.table_of_contents import Payload, get_table_of_contents
+
+router = APIRouter()
+
+# The table of contents only changes with a re-import; clients revalidate with the ETag
+CACHE_CONTROL = "public, max-age=3600"
+
+
+def accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            q = params.strip().lower()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def send_payload(request: Request, payload: Payload) -> Response:
+    """The precomputed body, gzipped if the client accepts it, or 304 if its copy is current."""
+    compressed = payload.gzip_body is not None and accepts_gzip(request)
+    etag = payload.gzip_etag if compressed else payload.etag
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=payload.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
+def _contents():
+    contents = get_table_of_contents()
+    if contents is None:
+        raise HTTPException(status_code=503, detail="Table of contents is not available yet")
+    return contents
+
+
+def _book_name(book_name: str) -> str:
+    resolver = get_book_resolver()
+    book = resolver.resolve(book_name) if resolver is not None else None
+    if book is None:
+        raise HTTPException(status_code=404, detail=f"Unknown book: {book_name}")
+    return book.name
+
+
+@router.get("/books", summary="Every book with its chapters and verse counts")
+@limiter.limit("600/minute")
+async def read_books(request: Request):
+    return send_payload(request, _contents().contents)
+
+
+@router.get("/books/{book_name}", summary="One book with its chapters and verse counts")
+@limiter.limit("600/minute")
+async def read_book(request: Request, book_name: str = Path(..., description="Name, abbreviation or alias")):
+    payload = _contents().books.get(_book_name(book_name))
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"Unknown book: {book_name}")
+    return send_payload(request, payload)
+
+
+@router.get("/books/{book_name}/chapters/{chapter_number}",
+            summary="A chapter's verse count with the previous and next chapter")
+@limiter.limit("600/minute")
+async def read_chapter(request: Request, book_name: str, chapter_number: int):
+    payload = _contents().chapters.get((_book_name(book_name), chapter_number))
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"{book_name} has no chapter {chapter_number}")
+    return send_payload(request, payload)
@@ -1,13 +1,22 @@
 from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.crud import get_verses_by_book_and_chapter, search_bible_text
 from typing import List, Optional
 from pydantic import BaseModel, Field
 from app import limiter
-from app.crud import get_current_devotional, save_current_devotional, get_all_devotionals
+from app.crud import get_current_devotional, save_current_devotional, get_all_devotionals, search_devotionals, export_devotionals, get_devotional_stats
 from app.utils import get_current_user_from_cookie
-from app.models import User, FavoriteVerse, Devotional
-from datetime import date
+from app.autosave import autosave_buffer
+from app.database import OVERLOAD_ERRORS
+from app.disconnect import ClientDisconnected, until_disconnected
+from app.models import User, FavoriteVerse, Devotional, DevotionalSearchPage, DevotionalStats
+from datetime import date, timedelta
+import base64
+import csv
 import datetime
+import io
+import json
+import logging
 
 
 class DevotionalSavePayload(BaseModel):
@@ -22,6 +31,20 @@ class DevotionalGetAllPayload(BaseModel):
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def encode_search_cursor(rank: float, devotional_id: int) -> str:
+    raw = json.dumps([rank, devotional_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> tuple:
+    try:
+        rank, devotional_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(rank), int(devotional_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/devotionals", response_model=List[Devotional], summary="Get all devotional for user")
@@ -36,16 +59,124 @@ async def get_devotionals(request: Request, limit: int = Query(10, ge=1),
     """
     try:
         devotionals = await get_all_devotionals(user_id=current_user.user_id, limit=limit, offset=offset, order_by=order_by)
-    except Exception as e:
-        # Log the error e
-        # Replace with proper logging
-        print(f"Database error fetching devotionals: {e}")
+    except OVERLOAD_ERRORS:
+        # Answered with 503 + Retry-After by the app-wide handler
+        raise
+    except Exception:
+        logger.exception("Database error fetching devotionals for user %s", current_user.user_id)
         raise HTTPException(
             status_code=500, detail="Error retrieving devotional data.")
 
     return devotionals  # FastAPI will serialize this using the Devotional model
 
 
+@router.get("/devotionals/search", response_model=DevotionalSearchPage, summary="Search the current user's reflections")
+@limiter.limit("50/minute")
+async def search_user_devotionals(request: Request,
+                                  q: str = Query(..., min_length=1, max_length=200,
+                                                 description='Words to find; supports "phrases", -word and or'),
+                                  limit: int = Query(20, ge=1, le=100),
+                                  cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+                                  current_user: User = Depends(get_current_user_from_cookie)):
+    """
+    Full-text search over the current user's devotional reflections, best
+    matches first, with highlighted snippets. Pages are chained with
+    `next_cursor` (keyset pagination, so deep pages cost the same as the first).
+    """
+    after = decode_search_cursor(cursor) if cursor else None
+    try:
+        # One extra row tells us whether there is a next page
+        results = await until_disconnected(request, search_devotionals(
+            user_id=current_user.user_id, search_query=q, limit=limit + 1, after=after))
+    except (ClientDisconnected, *OVERLOAD_ERRORS):
+        raise
+    except Exception:
+        logger.exception("Database error searching devotionals for user %s", current_user.user_id)
+        raise HTTPException(
+            status_code=500, detail="Error searching devotional data.")
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_search_cursor(results[-1]["rank"], results[-1]["devotional_id"])
+    return {"results": results, "next_cursor": next_cursor}
+
+
+EXPORT_CSV_COLUMNS = ["devotional_id", "devotional_date", "reflection",
+                      "favorite_verses", "created_at", "updated_at"]
+
+
+async def _export_ndjson(devotionals):
+    async for devotional in devotionals:
+        yield json.dumps(devotional, default=str, ensure_ascii=False) + "\n"
+
+
+async def _export_csv(devotionals):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    async for devotional in devotionals:
+        # Favorite verses as "Book chapter:verse" references, separated by "; "
+        references = "; ".join(
+            f"{verse['book_name']} {verse['chapter_number']}:{verse['verse_number']}"
+            for verse in devotional["favorite_verses"])
+        writer.writerow([devotional["devotional_id"], devotional["devotional_date"],
+                         devotional["reflection"], references,
+                         devotional["created_at"], devotional["updated_at"]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+@router.get("/devotionals/export", summary="Download all of the current user's devotionals")
+@limiter.limit("5/minute")
+async def export_user_devotionals(request: Request,
+                                  export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+                                  start: Optional[date] = Query(None, description="First date to include"),
+                                  end: Optional[date] = Query(None, description="Last date to include"),
+                                  current_user: User = Depends(get_current_user_from_cookie)):
+    """
+    Streams the user's devotionals, oldest first, with their favorite verses:
+    one JSON object per line (ndjson) or one CSV row per devotional.
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    devotionals = export_devotionals(user_id=current_user.user_id, start_date=start, end_date=end)
+    if export_format == "csv":
+        body, media_type = _export_csv(devotionals), "text/csv"
+    else:
+        body, media_type = _export_ndjson(devotionals), "application/x-ndjson"
+    filename = f"devotionals-{date.today().isoformat()}.{export_format}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@router.get("/devotionals/stats", response_model=DevotionalStats, summary="Streaks and monthly counts for the current user")
+@limiter.limit("50/minute")
+async def get_user_devotional_stats(request: Request, current_user: User = Depends(get_current_user_from_cookie)):
+    """
+    Current and longest streak (consecutive days with a devotional), totals and
+    per-month counts, read from the summary kept up to date on every save.
+    """
+    try:
+        stats = await get_devotional_stats(user_id=current_user.user_id)
+    except OVERLOAD_ERRORS:
+        raise
+    except Exception:
+        logger.exception("Database error fetching devotional stats for user %s", current_user.user_id)
+        raise HTTPException(
+            status_code=500, detail="Error retrieving devotional stats.")
+
+    if stats is None:
+        return {"total_entries": 0, "current_streak": 0, "longest_streak": 0, "monthly_counts": {}}
+
+    # A streak is still alive until a whole day passes without an entry
+    if stats["last_entry_date"] < date.today() - timedelta(days=1):
+        stats["current_streak"] = 0
+    return stats
+
+
 @router.get("/devotionals/today", response_model=Optional[Devotional], summary="Get the current user's devotional for today")
 @limiter.limit("50/minute")
 async def get_today_devotionals(request: Request, current_user: User = Depends(get_current_user_from_cookie)):
@@ -58,16 +189,19 @@ async def get_today_devotionals(request: Request, current_user: User = Depends(g
     today_date: date = date.today()
 
     try:
+        # A buffered autosave draft is newer than what's stored: write it first
+        await autosave_buffer.flush_key(current_user.user_id, today_date)
         devotional = await get_current_devotional(
             user_id=current_user.user_id,  # Assuming your User model has user_id
-            devotional_date=today_date
+            devotional_date=today_date,
+            from_primary=True
             # Pass db connection/session if required by your CRUD function
             # db=db_session
         )
-    except Exception as e:
-        # Log the error e
-        # Replace with proper logging
-        print(f"Database error fetching devotional: {e}")
+    except OVERLOAD_ERRORS:
+        raise
+    except Exception:
+        logger.exception("Database error fetching today's devotional for user %s", current_user.user_id)
         raise HTTPException(
             status_code=500, detail="Error retrieving devotional data.")
 
@@ -81,48 +215,42 @@ async def get_today_devotionals(request: Request, current_user: User = Depends(g
 # Still use Devotional model for response
 @router.post("/devotionals/save", response_model=Devotional)
 @limiter.limit("50/minute")
-async def save_devotional(request: Request, payload: DevotionalSavePayload, current_user: User = Depends(get_current_user_from_cookie)):
+async def save_devotional(request: Request, payload: DevotionalSavePayload,
+                          autosave: bool = Query(False, description="Editor autosave: buffer the draft and write it later"),
+                          current_user: User = Depends(get_current_user_from_cookie)):
     """
     Saves a devotional entry for the currently authenticated user for today's date.
     Also manages associated favorite verses.
 
     Returns the full, updated devotional entry including favorite verses.
+    With autosave=true the draft is only buffered (202); it is written within
+    AUTOSAVE_FLUSH_INTERVAL_SECONDS, or sooner by a regular save.
     """
     today_date: date = date.today()
 
+    if autosave:
+        await autosave_buffer.buffer(current_user.user_id, today_date,
+                                     payload.reflection, payload.favorite_verses)
+        return JSONResponse(status_code=202, content={"status": "buffered",
+                                                      "devotional_date": today_date.isoformat()})
+
+    # An explicit save supersedes any buffered draft
+    autosave_buffer.discard(current_user.user_id, today_date)
+
     try:
-        # Step 1: Call the CRUD function to perform the database operations.
-        await save_current_devotional(
+        # The save returns the complete devotional, favorite verses included,
+        # from its own transaction: no read-back (and no replica lag) needed
+        return await save_current_devotional(
             user_id=current_user.user_id,
             devotional_date=today_date,
             reflection=payload.reflection,
             favorite_verse_ids=payload.favorite_verses
         )
-
-        # Step 2: Fetch the complete devotional details *after* saving.
-        # get_current_devotional returns the structure matching the Devotional model.
-        complete_devotional = await get_current_devotional(
-            user_id=current_user.user_id,
-            devotional_date=today_date
-        )
-
-        # Step 3: Handle the unlikely case where fetching right after saving fails.
-        if complete_devotional is None:
-            log.error(
-                f"Failed to retrieve devotional for user {current_user.user_id} on {today_date} immediately after saving.")
-            raise HTTPException(
-                status_code=500, detail="Failed to retrieve devotional details after saving.")
-
-        # Step 4: Return the complete object fetched in Step 2.
-        # This object *will* contain the 'favorite_verses' list if fetched correctly.
-        return complete_devotional
-
-    except HTTPException as http_exc:
-        # Re-raise known HTTP exceptions
-        raise http_exc
-    except Exception as e:
+    except (HTTPException, *OVERLOAD_ERRORS):
+        # Re-raise known HTTP exceptions and overload errors (503)
+        raise
+    except Exception:
         # Log unexpected errors
-        log.error(
-            f"Error in save_devotional for user {current_user.user_id}: {e}", exc_info=True)
+        logger.exception("Error in save_devotional for user %s", current_user.user_id)
         raise HTTPException(
             status_code=500, detail="An error occurred while saving the devotional data.")
@@ -0,0 +1,40 @@
+# app/routes/typeahead.py
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
+from pydantic import BaseModel
+from app import limiter, typeahead
+
+
+class ReferenceCompletion(BaseModel):
+    label: str
+    book: str
+    chapter: Optional[int] = None
+
+
+class TermCompletion(BaseModel):
+    term: str
+    count: int
+    completion: str
+
+
+class TypeaheadResult(BaseModel):
+    references: List[ReferenceCompletion]
+    terms: List[TermCompletion]
+
+
+router = APIRouter()
+
+
+# Served entirely from memory: cheap enough to call on every keystroke
+@router.get("/typeahead", response_model=TypeaheadResult)
+@limiter.limit("600/minute")
+async def read_typeahead(
+    request: Request,
+    prefix: str = Query(..., min_length=1, max_length=50,
+                        description="What the user has typed so far"),
+    k: int = Query(8, ge=1, le=typeahead.MAX_COMPLETIONS,
+                   description="Maximum completions per kind")
+):
+    if not typeahead.is_loaded():
+        raise HTTPException(status_code=503, detail="Typeahead index is still loading")
+    return typeahead.complete(prefix, k)
@@ -0,0 +1,44 @@
+# app/routes/verse_of_day.py
+from datetime import datetime, time, timedelta, timezone
+from email.utils import format_datetime
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from app import limiter
+from app.config import VOTD_DEFAULT_TIMEZONE
+from app.verse_of_day import get_verse_of_the_day
+
+router = APIRouter()
+
+
+# Served from memory: the body and ETag for each day are built ahead of time
+@router.get("/verse-of-the-day", summary="Today's verse in the given timezone")
+@limiter.limit("600/minute")
+async def read_verse_of_the_day(
+    request: Request,
+    tz: Optional[str] = Query(
+        None, description="IANA timezone, e.g. America/New_York; defaults to the server's setting")
+):
+    try:
+        zone = ZoneInfo(tz or VOTD_DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+
+    now = datetime.now(zone)
+    verse = get_verse_of_the_day(now.date())
+    if verse is None:
+        raise HTTPException(status_code=503, detail="Verse of the day is not available yet")
+
+    # Everyone in this timezone gets the same bytes until local midnight
+    # (compared in UTC: same-zone subtraction ignores a DST change in between)
+    midnight = datetime.combine(now.date() + timedelta(days=1), time.min, tzinfo=zone).astimezone(timezone.utc)
+    max_age = max(int((midnight - now.astimezone(timezone.utc)).total_seconds()), 1)
+    headers = {
+        "Cache-Control": f"public, max-age={max_age}, immutable",
+        "Expires": format_datetime(midnight, usegmt=True),
+        "ETag": verse["etag"],
+    }
+
+    if request.headers.get("if-none-match") == verse["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=verse["body"], media_type="application/json", headers=headers)
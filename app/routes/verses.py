@@ -1,11 +1,33 @@
 # app/routes/verses.py
-from fastapi import APIRouter, HTTPException, Query, Request
-from app.crud import get_verses_by_book_and_chapter, search_bible_text
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from app.crud import get_verses_by_book_and_chapter, get_verses_by_chapter_id, get_verses_by_ids, search_bible_text, search_bible_advanced, search_bible_faceted
+from app.search_query import is_advanced_query, parse_search_query, SearchQueryError
+from app.book_resolver import get_book_resolver
+from app.related import get_related_index
+from app.cache import negative_cache
+from app.response_format import is_shaped, parse_fields, render, shape_rows, vary_on_accept
+from app.disconnect import until_disconnected
+from app.popular_verses import WINDOWS, get_popular_verses
+from app.config import POPULAR_VERSES_TOP_K
+from typing import Dict, List, Optional, Union
 from pydantic import BaseModel, Field
 from app import limiter
 
 
+VERSE_FIELDS = ("id", "verse_number", "text")
+SEARCH_FIELDS = ("book_name", "chapter_number", "verse_number", "text", "rank")
+RELATED_FIELDS = ("id", "book_name", "chapter_number", "verse_number", "text", "score")
+
+
+def fields_query():
+    return Query(None, description="Comma-separated fields to return, e.g. verse_number,text")
+
+
+def layout_query():
+    return Query(None, alias="format", pattern="^(objects|columns)$",
+                 description="'columns' returns one array per field instead of one object per row")
+
+
 class Verse(BaseModel):
     verse_id: int = Field(alias="id")
     verse_number: int
@@ -20,38 +42,215 @@ class SearchResult(BaseModel):
     rank: float
 
 
+class RelatedVerse(BaseModel):
+    verse_id: int = Field(alias="id")
+    book_name: str
+    chapter_number: int
+    verse_number: int
+    text: str
+    score: float
+
+
+class PopularVerse(BaseModel):
+    verse_id: int = Field(alias="id")
+    book_name: str
+    chapter_number: int
+    verse_number: int
+    text: str
+    favorites: int
+
+
+class BookCount(BaseModel):
+    book_name: str
+    testament: str
+    count: int
+
+
+class SearchPage(BaseModel):
+    total: int
+    filtered_total: int
+    testament_counts: Dict[str, int]
+    book_counts: List[BookCount]
+    results: List[SearchResult]
+
+
 # Initialize the router for verses
 router = APIRouter()
 
+# Registered before /verses/{book_name}/{chapter_number}, which would otherwise
+# claim /verses/<id>/related
+@router.get("/verses/{verse_id}/related", response_model=List[RelatedVerse],
+            dependencies=[Depends(vary_on_accept)])
+@limiter.limit("150/minute")
+async def read_related_verses(
+    request: Request,
+    verse_id: int,
+    k: int = Query(5, ge=1, le=50, description="Maximum number of related verses"),
+    fields: Optional[str] = fields_query(),
+    layout: Optional[str] = layout_query()
+):
+    selected = parse_fields(fields, RELATED_FIELDS)
+    index = get_related_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Related verses are not available")
+
+    # Precomputed neighbors; the only query fetches their text by primary key
+    neighbors = index.related(verse_id, k)
+    if neighbors is None:
+        raise HTTPException(status_code=404, detail="Verse not found")
+
+    related = []
+    if neighbors:
+        verses = {verse["id"]: verse for verse in await get_verses_by_ids([n for n, _ in neighbors])}
+        related = [
+            {**verses[neighbor_id], "score": score}
+            for neighbor_id, score in neighbors
+            if neighbor_id in verses
+        ]
+
+    if is_shaped(request, fields, layout):
+        return render(request, shape_rows(related, selected or RELATED_FIELDS, layout == "columns"))
+    return related
+
+
+@router.get("/verses/popular", response_model=List[PopularVerse],
+            summary="Verses most often chosen as devotional favorites in a recent window")
+@limiter.limit("300/minute")
+async def read_popular_verses(
+    request: Request,
+    window: str = Query("week", pattern="^(" + "|".join(WINDOWS) + ")$",
+                        description="day, week, month or year (counted by devotional date)"),
+    limit: int = Query(10, ge=1, le=POPULAR_VERSES_TOP_K, description="Maximum number of verses")
+):
+    popular = await get_popular_verses(window)
+    return popular[:limit]
+
+
 # Define a GET endpoint to retrieve verses by book and chapter
 
 
-@router.get("/verses/{book_name}/{chapter_number}", response_model=List[Verse])
+@router.get("/verses/{book_name}/{chapter_number}", response_model=List[Verse],
+            dependencies=[Depends(vary_on_accept)])
 @limiter.limit("150/minute")
-async def read_verses(request: Request, book_name: str, chapter_number: int):
-    verses = await get_verses_by_book_and_chapter(book_name, chapter_number)
+async def read_verses(
+    request: Request,
+    book_name: str,
+    chapter_number: int,
+    fields: Optional[str] = fields_query(),
+    layout: Optional[str] = layout_query()
+):
+    selected = parse_fields(fields, VERSE_FIELDS)
+    # Keyed on exactly what the lookup gets: without the resolver, names match case-sensitively
+    miss_key = (book_name, chapter_number)
+    if negative_cache.contains("verses", miss_key):
+        raise HTTPException(status_code=404, detail="Verses not found")
+
+    resolver = get_book_resolver()
+    if resolver is None:
+        # Resolver not built yet (warmup still running): exact-name lookup in the database
+        verses = await get_verses_by_book_and_chapter(book_name, chapter_number)
+    else:
+        # Unknown books and out-of-range chapters are rejected without a query
+        book, chapter_id = resolver.resolve_chapter(book_name, chapter_number)
+        if book is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        if chapter_id is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Chapter not found: {book.name} has {book.chapter_count} chapters")
+        verses = await get_verses_by_chapter_id(chapter_id)
 
     if not verses:
+        negative_cache.add("verses", miss_key)
         raise HTTPException(status_code=404, detail="Verses not found")
 
+    if is_shaped(request, fields, layout):
+        return render(request, shape_rows(verses, selected or VERSE_FIELDS, layout == "columns"))
+
     # Return the list of verses
     return verses
 
 # Define a GET endpoint to search the Bible
 
 
-@router.get("/search", response_model=List[SearchResult])
+@router.get("/search", response_model=Union[List[SearchResult], SearchPage],
+            dependencies=[Depends(vary_on_accept)])
 @limiter.limit("50/minute")
 async def search_bible(
     request: Request,
-    query: str = Query(..., description="Text to search for in the Bible"),
+    query: str = Query(
+        ..., description='Text to search for in the Bible. Supports "exact phrases", '
+                         'word NEAR/n word, prefix*, AND, OR, NOT / -word and parentheses'),
     limit: Optional[int] = Query(
-        50, description="Maximum number of results to return")
+        50, description="Maximum number of results to return"),
+    book: Optional[str] = Query(
+        None, description="Only return verses from this book (name, abbreviation or alias)"),
+    testament: Optional[str] = Query(
+        None, pattern="^(OT|NT)$", description="Only return verses from this testament"),
+    facets: bool = Query(
+        False, description="Return a page with per-book and per-testament hit counts"),
+    fields: Optional[str] = fields_query(),
+    layout: Optional[str] = layout_query()
 ):
-    results = await search_bible_text(query, limit)
+    selected = parse_fields(fields, SEARCH_FIELDS)
+    shaped = is_shaped(request, fields, layout)
+
+    if book is not None:
+        resolver = get_book_resolver()
+        if resolver is not None:
+            resolved = resolver.resolve(book)
+            if resolved is None:
+                raise HTTPException(status_code=400, detail=f"Unknown book: {book}")
+            book = resolved.name
+
+    parsed_query = None
+    if is_advanced_query(query):
+        # Phrases, NEAR/n, prefixes and boolean operators
+        try:
+            parsed_query = parse_search_query(query)
+        except SearchQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Keyed on exactly what the backend searches with: the short-query ILIKE
+    # pattern keeps the query's whitespace, so "Lord " and "lord" can differ
+    miss_key = (query, limit, book, testament)
+
+    if facets:
+        # An empty page is a valid answer here; only "no match at all" is cached
+        if negative_cache.contains("search_facets", miss_key[0]):
+            page = {"total": 0, "filtered_total": 0, "testament_counts": {"OT": 0, "NT": 0},
+                    "book_counts": [], "results": []}
+        else:
+            page = await until_disconnected(
+                request, search_bible_faceted(query, limit, book, testament, parsed_query))
+            if not page["total"]:
+                negative_cache.add("search_facets", miss_key[0])
+        if shaped:
+            return render(request, {
+                **page,
+                "results": shape_rows(page["results"], selected or SEARCH_FIELDS, layout == "columns"),
+            })
+        return page
+
+    if negative_cache.contains("search", miss_key):
+        raise HTTPException(
+            status_code=404, detail="No verses found matching your search")
+
+    # Searches can be slow: stop the query if the client gives up on it
+    if book is not None or testament is not None:
+        page = await until_disconnected(
+            request, search_bible_faceted(query, limit, book, testament, parsed_query))
+        results = page["results"]
+    elif parsed_query is not None:
+        results = await until_disconnected(request, search_bible_advanced(parsed_query, limit))
+    else:
+        results = await until_disconnected(request, search_bible_text(query, limit))
 
     if not results:
+        negative_cache.add("search", miss_key)
         raise HTTPException(
             status_code=404, detail="No verses found matching your search")
 
+    if shaped:
+        return render(request, shape_rows(results, selected or SEARCH_FIELDS, layout == "columns"))
     return results
@@ -0,0 +1,189 @@
+# app/scheduler.py
+"""
+In-process background scheduler.
+
+Jobs are registered with @scheduled_job and started/stopped with the app
+(see app/main.py). Each job runs every `interval` seconds on its own task; a
+failing run is logged and counted, and the job simply runs again next time.
+
+Jobs that refresh in-process state (caches, the verse-of-the-day window) run
+on every worker. Jobs marked leader_only write shared database aggregates and
+run on a single worker: the one holding the Postgres advisory lock
+SCHEDULER_LEADER_LOCK_ID on its own dedicated connection. If that worker dies
+its connection closes, the lock is released, and another worker takes over
+on its next attempt. The leader re-checks that it still holds the lock before
+every leader-only run, and steps down if the check fails. Instances with
+SCHEDULER_LEADER_ELIGIBLE=false never take the lock.
+"""
+import asyncio
+import functools
+import logging
+import time
+from dataclasses import dataclass, field
+from app.config import (
+    SCHEDULER_LEADER_LOCK_ID,
+    SCHEDULER_LEADER_ELIGIBLE,
+    BIBLE_STATS_REFRESH_SECONDS,
+    FAVORITE_BUCKET_RETENTION_DAYS,
+)
+from app import crud
+from app.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Whether this session holds advisory lock $1 (a single bigint key is split
+# into classid/objid)
+LEADER_LOCK_HELD_QUERY = """
+    SELECT EXISTS (
+        SELECT 1 FROM pg_locks
+        WHERE locktype = 'advisory' AND pid = pg_backend_pid() AND granted
+          AND objsubid = 1 AND ((classid::bigint << 32) | objid::bigint) = $1
+    )
+"""
+# A leader whose lock connection can't answer within this long steps down
+LEADER_CHECK_TIMEOUT_SECONDS = 5
+
+
+@dataclass
+class Job:
+    name: str
+    interval: float
+    func: object
+    leader_only: bool = False
+    stats: dict = field(default_factory=lambda: {
+        "runs": 0,
+        "failures": 0,
+        "skipped_not_leader": 0,
+        "last_started_at": None,
+        "last_duration_ms": None,
+        "last_success_at": None,
+        "last_error": None,
+    })
+
+
+class Scheduler:
+    def __init__(self, leader_lock_id: int, leader_eligible: bool = True):
+        self.leader_lock_id = leader_lock_id
+        self.leader_eligible = leader_eligible
+        self.jobs = []
+        self._tasks = []
+        self._leader_conn = None
+        self._leader_lock = asyncio.Lock()
+
+    def add_job(self, name: str, interval: float, func, leader_only: bool = False):
+        self.jobs.append(Job(name, interval, func, leader_only))
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_conn is not None and not self._leader_conn.is_closed()
+
+    async def _ensure_leader(self) -> bool:
+        if not self.leader_eligible:
+            return False
+        async with self._leader_lock:
+            if self._leader_conn is not None and await self._still_leader():
+                return True
+            conn = await get_db_connection()
+            try:
+                acquired = await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.leader_lock_id)
+            except Exception:
+                await conn.close()
+                raise
+            if not acquired:
+                await conn.close()
+                return False
+            logger.info("This worker is now the scheduler leader")
+            self._leader_conn = conn
+            return True
+
+    async def _still_leader(self) -> bool:
+        """
+        Re-checks the lock on its own session before a leader-only run. A TCP
+        session that broke without asyncpg noticing may already have lost the
+        lock to another worker; if the check fails, leadership is dropped.
+        """
+        try:
+            held = await self._leader_conn.fetchval(
+                LEADER_LOCK_HELD_QUERY, self.leader_lock_id, timeout=LEADER_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning("Scheduler leader lock check failed: %s", e)
+            held = False
+        if not held:
+            logger.warning("This worker is no longer the scheduler leader")
+            self._leader_conn.terminate()
+            self._leader_conn = None
+        return held
+
+    async def run_job(self, job: Job):
+        """Runs a job once (if this worker may run it) and records the outcome."""
+        try:
+            if job.leader_only and not await self._ensure_leader():
+                job.stats["skipped_not_leader"] += 1
+                return
+        except Exception as e:
+            job.stats["failures"] += 1
+            job.stats["last_error"] = f"leader election: {e}"
+            logger.warning("Scheduler could not check leadership for %s: %s", job.name, e)
+            return
+
+        job.stats["runs"] += 1
+        job.stats["last_started_at"] = time.time()
+        started = time.monotonic()
+        try:
+            await job.func()
+        except Exception as e:
+            job.stats["failures"] += 1
+            job.stats["last_error"] = str(e)
+            logger.warning("Scheduled job %s failed: %s", job.name, e)
+        else:
+            job.stats["last_success_at"] = time.time()
+            job.stats["last_error"] = None
+        finally:
+            job.stats["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    async def _loop(self, job: Job):
+        while True:
+            await asyncio.sleep(job.interval)
+            await self.run_job(job)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._loop(job)) for job in self.jobs]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._leader_conn is not None:
+            # Closing the session releases the advisory lock
+            await self._leader_conn.close()
+            self._leader_conn = None
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._tasks),
+            "leader": self.is_leader,
+            "leader_eligible": self.leader_eligible,
+            "jobs": {
+                job.name: {"interval_seconds": job.interval, "leader_only": job.leader_only, **job.stats}
+                for job in self.jobs
+            },
+        }
+
+
+scheduler = Scheduler(SCHEDULER_LEADER_LOCK_ID, SCHEDULER_LEADER_ELIGIBLE)
+
+
+def scheduled_job(name: str, interval: float, leader_only: bool = False):
+    """Decorator: runs an async function every `interval` seconds once the scheduler starts."""
+    def decorator(func):
+        scheduler.add_job(name, interval, func, leader_only)
+        return func
+    return decorator
+
+
+scheduler.add_job("bible_stats", BIBLE_STATS_REFRESH_SECONDS, crud.refresh_bible_stats, leader_only=True)
+scheduler.add_job("favorite_buckets_prune", 24 * 3600,
+                  functools.partial(crud.prune_favorite_buckets, FAVORITE_BUCKET_RETENTION_DAYS),
+                  leader_only=True)
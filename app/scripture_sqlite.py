@@ -0,0 +1,553 @@
+# app/scripture_sqlite.py
+"""
+Read-only scripture backend served from a local SQLite file.
+
+The file is built by `bible-data/importBible.py` (see `build_sqlite_backend`)
+from the Postgres tables, so every worker can answer verse and search reads
+without touching the shared database.
+
+To return the same results as the Postgres backend, the file stores each
+verse's `to_tsvector('english', text)` output and a lexicon mapping every
+corpus word to its Postgres lexeme. Query words the corpus doesn't contain
+go through the same English Snowball stemmer and stopword list as Postgres'
+english_stem dictionary, so an unused inflection of a corpus word still
+matches. The FTS5 table only narrows the candidates; matching and `ts_rank`
+are then reproduced from the stored lexeme positions.
+"""
+import asyncio
+import math
+import re
+import sqlite3
+import struct
+import threading
+from collections import Counter
+import snowballstemmer
+from app.config import SCRIPTURE_SQLITE_PATH
+from app import search_query
+from app.query_counter import count_query
+
+# Words are split the same way when the lexicon is built in importBible.py
+WORD_PATTERN = re.compile(r"\w+")
+TSVECTOR_ENTRY_PATTERN = re.compile(r"'((?:[^']|'')*)':([0-9A-D,]+)")
+
+# ts_rank() defaults: unlabelled lexemes carry weight D = 0.1
+DEFAULT_WEIGHT = 0.1
+
+# Postgres' tsearch_data/english.stop: words the english_stem dictionary drops
+ENGLISH_STOPWORDS = frozenset("""
+    i me my myself we our ours ourselves you your yours yourself yourselves he
+    him his himself she her hers herself it its itself they them their theirs
+    themselves what which who whom this that these those am is are was were be
+    been being have has had having do does did doing a an the and but if or
+    because as until while of at by for with about against between into
+    through during before after above below to from up down in out on off over
+    under again further then once here there when where why how all any both
+    each few more most other some such no nor not only own same so than too
+    very s t can will just don should now
+""".split())
+
+_local = threading.local()
+
+
+def _get_connection() -> sqlite3.Connection:
+    # sqlite3 connections are not shared between threads; one per worker thread
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(
+            f"file:{SCRIPTURE_SQLITE_PATH}?mode=ro&immutable=1", uri=True)
+        conn.row_factory = sqlite3.Row
+        # Map the whole file so worker processes share the OS page cache
+        conn.execute("PRAGMA mmap_size = 268435456")
+        _local.conn = conn
+    return conn
+
+
+def fts_token(lexeme: str) -> str:
+    """Encodes a Postgres lexeme as a single FTS5 token (see importBible.py)."""
+    return re.sub(r"\W", "_", lexeme)
+
+
+def parse_tsvector(tsvector_text: str) -> dict:
+    """Parses `to_tsvector(...)::text` output into {lexeme: [positions]}."""
+    parsed = {}
+    for lexeme, positions in TSVECTOR_ENTRY_PATTERN.findall(tsvector_text):
+        parsed[lexeme.replace("''", "'")] = [
+            int(position.rstrip("ABCD")) for position in positions.split(",")]
+    return parsed
+
+
+def _stem(word: str):
+    """What to_tsvector('english', ...) makes of a word missing from the lexicon (None: stopword)."""
+    if word in ENGLISH_STOPWORDS:
+        return None
+    if any(ch.isdigit() for ch in word):
+        # The parser calls these numwords; the simple dictionary only lower-cases them
+        return word
+    # Stemmer objects keep state while stemming: one per worker thread
+    stemmer = getattr(_local, "stemmer", None)
+    if stemmer is None:
+        stemmer = _local.stemmer = snowballstemmer.stemmer("english")
+    return stemmer.stemWord(word)
+
+
+def _lexicon_for(conn: sqlite3.Connection, words) -> dict:
+    """Maps each query word to its Postgres lexeme (None for stopwords)."""
+    words = sorted(set(words))
+    if not words:
+        return {}
+    placeholders = ",".join("?" * len(words))
+    known = {
+        row["word"]: row["lexeme"]
+        for row in conn.execute(
+            f"SELECT word, lexeme FROM lexicon WHERE word IN ({placeholders})", words)
+    }
+    return {word: known[word] if word in known else _stem(word) for word in words}
+
+
+def _lookup_lexemes(conn: sqlite3.Connection, words: list) -> list:
+    """Maps query words to lexemes the way plainto_tsquery would; stopwords are dropped."""
+    lexicon = _lexicon_for(conn, words)
+    return [lexicon[word] for word in words if lexicon[word] is not None]
+
+
+def _word_distance(distance: int) -> float:
+    if distance > 100:
+        return 1e-30
+    return 1.0 / (1.005 + 0.05 * math.exp(distance / 1.5 - 2))
+
+
+def _find_entries(document: dict, lexeme: str, prefix: bool = False) -> list:
+    if prefix:
+        return [document[key] for key in sorted(document) if key.startswith(lexeme)]
+    return [document[lexeme]] if lexeme in document else []
+
+
+def _rank_or(document: dict, items: list) -> float:
+    rank = 0.0
+    for lexeme, prefix in items:
+        for positions in _find_entries(document, lexeme, prefix):
+            # With uniform weights Postgres' max-weight correction cancels out
+            rank += sum(DEFAULT_WEIGHT / ((j + 1) * (j + 1))
+                        for j in range(len(positions))) / 1.64493406685
+    return rank / len(items) if items else rank
+
+
+def _rank_and(document: dict, items: list) -> float:
+    rank = -1.0
+    item_positions = [None] * len(items)
+    for i, (lexeme, prefix) in enumerate(items):
+        for positions in _find_entries(document, lexeme, prefix):
+            item_positions[i] = positions
+            for k in range(i):
+                if item_positions[k] is None:
+                    continue
+                for position in positions:
+                    for other in item_positions[k]:
+                        distance = abs(position - other)
+                        if distance:
+                            weight = math.sqrt(
+                                DEFAULT_WEIGHT * DEFAULT_WEIGHT * _word_distance(distance))
+                            rank = weight if rank < 0 else 1.0 - (1.0 - rank) * (1.0 - weight)
+    return rank
+
+
+def ts_rank(document: dict, items: list, conjunctive: bool) -> float:
+    """
+    Python port of Postgres' ts_rank() with default weights and normalization 0.
+
+    Args:
+        document: Parsed tsvector, {lexeme: [positions]}.
+        items: (lexeme, is_prefix) query operands.
+        conjunctive: Whether the top-level query operator is AND or a phrase.
+    """
+    items = sorted(set(items))
+    if conjunctive and len(items) >= 2:
+        rank = _rank_and(document, items)
+    else:
+        rank = _rank_or(document, items)
+    if rank < 0:
+        rank = 1e-20
+    # ts_rank() returns float4; round-trip so values compare equal to Postgres'
+    return struct.unpack("f", struct.pack("f", rank))[0]
+
+
+SEARCH_COLUMNS = """
+    b.name AS book_name,
+    c.chapter_number,
+    v.verse_number,
+    v.text
+"""
+
+
+def _search_full_text(conn: sqlite3.Connection, search_query: str, limit) -> list:
+    lexemes = _lookup_lexemes(conn, WORD_PATTERN.findall(search_query.lower()))
+    if not lexemes:
+        # An all-stopword query matches nothing in Postgres either
+        return []
+
+    match_expression = " AND ".join(
+        f'"{fts_token(lexeme)}"' for lexeme in sorted(set(lexemes)))
+    rows = conn.execute(
+        f"""
+            SELECT {SEARCH_COLUMNS}, v.id, v.tsv
+            FROM verses_fts f
+            JOIN verses v ON v.id = f.rowid
+            JOIN chapters c ON v.chapter_id = c.id
+            JOIN books b ON c.book_id = b.id
+            WHERE verses_fts MATCH ?
+        """,
+        (match_expression,),
+    ).fetchall()
+
+    items = [(lexeme, False) for lexeme in lexemes]
+    results = []
+    for row in rows:
+        document = parse_tsvector(row["tsv"])
+        # The FTS5 token encoding can merge distinct lexemes; re-check exactly
+        if not all(lexeme in document for lexeme in lexemes):
+            continue
+        result = {key: row[key] for key in ("book_name", "chapter_number", "verse_number", "text")}
+        result["rank"] = ts_rank(document, items, conjunctive=True)
+        results.append((result, row["id"]))
+
+    results.sort(key=lambda pair: (-pair[0]["rank"], pair[1]))
+    if limit is not None:
+        results = results[:limit]
+    return [result for result, _ in results]
+
+
+def _search_ilike(conn: sqlite3.Connection, like_pattern: str, limit) -> list:
+    # SQLite's LIKE is case-insensitive for ASCII, matching ILIKE on this corpus
+    rows = conn.execute(
+        f"""
+            SELECT {SEARCH_COLUMNS}, 1.0 AS rank
+            FROM verses v
+            JOIN chapters c ON v.chapter_id = c.id
+            JOIN books b ON c.book_id = b.id
+            WHERE v.text LIKE ?
+            ORDER BY b.name, c.chapter_number, v.verse_number
+            LIMIT ?
+        """,
+        (like_pattern, -1 if limit is None else limit),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# --- Advanced (phrase / proximity / prefix / boolean) search ---
+#
+# The parsed query (app.search_query) is first mapped to lexemes the way
+# to_tsquery('english', ...) would: stopwords are dropped, and inside a
+# phrase they widen the distance between the remaining words. Nodes are
+# tuples: ("term", lexeme, prefix), ("phrase", [(lexeme, distance), ...]),
+# ("near", term, term, n), ("not", child), ("and", [...]), ("or", [...]).
+
+
+def _to_lexeme_tree(node, lexicon: dict):
+    if isinstance(node, search_query.Term):
+        lexeme = lexicon[node.word]
+        return None if lexeme is None else ("term", lexeme, node.prefix)
+    if isinstance(node, search_query.Phrase):
+        parts, distance = [], 0
+        for word in node.words:
+            distance += 1
+            lexeme = lexicon[word]
+            if lexeme is None:
+                continue
+            parts.append((lexeme, distance if parts else 0))
+            distance = 0
+        if not parts:
+            return None
+        return ("term", parts[0][0], False) if len(parts) == 1 else ("phrase", parts)
+    if isinstance(node, search_query.Near):
+        left = _to_lexeme_tree(node.left, lexicon)
+        right = _to_lexeme_tree(node.right, lexicon)
+        if left is None or right is None:
+            return left or right
+        return ("near", left, right, node.distance)
+    if isinstance(node, search_query.Not):
+        child = _to_lexeme_tree(node.child, lexicon)
+        return None if child is None else ("not", child)
+    children = [c for c in (_to_lexeme_tree(child, lexicon) for child in node.children) if c]
+    if not children:
+        return None
+    if len(children) == 1:
+        return children[0]
+    return ("and" if isinstance(node, search_query.And) else "or", children)
+
+
+def _term_positions(document: dict, lexeme: str, prefix: bool) -> set:
+    positions = set()
+    for entry in _find_entries(document, lexeme, prefix):
+        positions.update(entry)
+    return positions
+
+
+def _matches(node, document: dict) -> bool:
+    kind = node[0]
+    if kind == "term":
+        return bool(_term_positions(document, node[1], node[2]))
+    if kind == "phrase":
+        # Postgres semantics: each word sits exactly `distance` positions after the previous one
+        positions = document.get(node[1][0][0], [])
+        for lexeme, distance in node[1][1:]:
+            previous = set(positions)
+            positions = [p for p in document.get(lexeme, []) if p - distance in previous]
+            if not positions:
+                return False
+        return bool(positions)
+    if kind == "near":
+        left = _term_positions(document, node[1][1], node[1][2])
+        right = _term_positions(document, node[2][1], node[2][2])
+        return any(1 <= abs(a - b) <= node[3] for a in left for b in right)
+    if kind == "not":
+        return not _matches(node[1], document)
+    if kind == "and":
+        return all(_matches(child, document) for child in node[1])
+    return any(_matches(child, document) for child in node[1])
+
+
+def _rank_items(node) -> list:
+    # ts_rank() scores every operand, including excluded ones
+    kind = node[0]
+    if kind == "term":
+        return [(node[1], node[2])]
+    if kind == "phrase":
+        return [(lexeme, False) for lexeme, _ in node[1]]
+    if kind == "near":
+        return _rank_items(node[1]) + _rank_items(node[2])
+    if kind == "not":
+        return _rank_items(node[1])
+    return [item for child in node[1] for item in _rank_items(child)]
+
+
+def _candidate_expression(node):
+    """
+    FTS5 expression for a superset of the matches, or None where Postgres'
+    querytree() could not use the index either (pure exclusions).
+    """
+    kind = node[0]
+    if kind == "term":
+        return f'"{fts_token(node[1])}"' + ("*" if node[2] else "")
+    if kind == "phrase":
+        return "(" + " AND ".join(f'"{fts_token(lexeme)}"' for lexeme, _ in node[1]) + ")"
+    if kind == "near":
+        return f"({_candidate_expression(node[1])} AND {_candidate_expression(node[2])})"
+    if kind == "not":
+        return None
+    children = [_candidate_expression(child) for child in node[1]]
+    if kind == "and":
+        children = [child for child in children if child]
+        return "(" + " AND ".join(children) + ")" if children else None
+    if any(child is None for child in children):
+        return None
+    return "(" + " OR ".join(children) + ")"
+
+
+def _search_advanced(parsed_query, limit) -> list:
+    conn = _get_connection()
+    lexicon = _lexicon_for(conn, (
+        word
+        for node in search_query.walk(parsed_query)
+        for word in (
+            node.words if isinstance(node, search_query.Phrase)
+            else (node.word,) if isinstance(node, search_query.Term)
+            else ()
+        )
+    ))
+
+    tree = _to_lexeme_tree(parsed_query, lexicon)
+    expression = _candidate_expression(tree) if tree else None
+    if expression is None:
+        return []
+
+    rows = conn.execute(
+        f"""
+            SELECT {SEARCH_COLUMNS}, v.id, v.tsv
+            FROM verses_fts f
+            JOIN verses v ON v.id = f.rowid
+            JOIN chapters c ON v.chapter_id = c.id
+            JOIN books b ON c.book_id = b.id
+            WHERE verses_fts MATCH ?
+        """,
+        (expression,),
+    ).fetchall()
+
+    items = _rank_items(tree)
+    conjunctive = tree[0] in ("and", "phrase")
+    results = []
+    for row in rows:
+        document = parse_tsvector(row["tsv"])
+        if not _matches(tree, document):
+            continue
+        result = {key: row[key] for key in ("book_name", "chapter_number", "verse_number", "text")}
+        result["rank"] = ts_rank(document, items, conjunctive)
+        results.append((result, row["id"]))
+
+    results.sort(key=lambda pair: (-pair[0]["rank"], pair[1]))
+    if limit is not None:
+        results = results[:limit]
+    return [result for result, _ in results]
+
+
+def _get_verses_by_book_and_chapter(book_name: str, chapter_number: int) -> list:
+    rows = _get_connection().execute(
+        """
+            SELECT v.verse_number, v.text, v.id
+            FROM verses v
+            JOIN chapters c ON v.chapter_id = c.id
+            JOIN books b ON c.book_id = b.id
+            WHERE b.name = ? AND c.chapter_number = ?
+            ORDER BY v.verse_number
+        """,
+        (book_name, chapter_number),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _get_verses_by_chapter_id(chapter_id: int) -> list:
+    rows = _get_connection().execute(
+        "SELECT verse_number, text, id FROM verses WHERE chapter_id = ? ORDER BY verse_number",
+        (chapter_id,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _get_verses_by_ids(verse_ids: list) -> list:
+    placeholders = ",".join("?" * len(verse_ids))
+    rows = _get_connection().execute(
+        f"""
+            SELECT v.id, b.name AS book_name, c.chapter_number, v.verse_number, v.text
+            FROM verses v
+            JOIN chapters c ON v.chapter_id = c.id
+            JOIN books b ON c.book_id = b.id
+            WHERE v.id IN ({placeholders})
+        """,
+        list(verse_ids),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _get_scripture_catalog() -> dict:
+    conn = _get_connection()
+    books = conn.execute(
+        "SELECT id, name, abbreviation, testament, position FROM books ORDER BY position").fetchall()
+    chapters = conn.execute("""
+        SELECT c.id, c.book_id, c.chapter_number, count(v.id) AS verse_count
+        FROM chapters c
+        LEFT JOIN verses v ON v.chapter_id = c.id
+        GROUP BY c.id, c.book_id, c.chapter_number
+        ORDER BY c.book_id, c.chapter_number
+    """).fetchall()
+    return {
+        "books": [dict(book) for book in books],
+        "chapters": [dict(chapter) for chapter in chapters],
+    }
+
+
+def _get_corpus_version() -> str:
+    return _get_connection().execute(
+        "SELECT count(*) || ':' || coalesce(max(id), 0) FROM verses").fetchone()[0]
+
+
+def _get_term_frequencies() -> list:
+    counts = Counter()
+    for (text,) in _get_connection().execute("SELECT text FROM verses"):
+        counts.update(WORD_PATTERN.findall(text.lower()))
+    return list(counts.items())
+
+
+def _search_bible_text(search_query: str, limit) -> list:
+    # Same strategy and fallback order as crud.search_bible_text
+    conn = _get_connection()
+    if len(search_query.strip()) < 4:
+        results = _search_ilike(conn, f'% {search_query} %', limit)
+        if not results:
+            results = _search_full_text(conn, search_query, limit)
+    else:
+        results = _search_full_text(conn, search_query, limit)
+        if not results:
+            results = _search_ilike(conn, f'%{search_query}%', limit)
+    return results
+
+
+def _search_faceted(search_query: str, limit, book, testament, parsed_query) -> dict:
+    # Same result as crud.FACETED_SEARCH_TEMPLATE: counts over every match,
+    # the book/testament filter applied to the page only
+    conn = _get_connection()
+    if parsed_query is not None:
+        matches = _search_advanced(parsed_query, None)
+    else:
+        matches = _search_bible_text(search_query, None)
+
+    books = {
+        row["name"]: row
+        for row in conn.execute("SELECT name, testament, position FROM books")
+    }
+    filtered = [
+        match for match in matches
+        if (book is None or match["book_name"] == book)
+        and (testament is None or books[match["book_name"]]["testament"] == testament)
+    ]
+    counts = Counter(match["book_name"] for match in matches)
+    return {
+        "total": len(matches),
+        "filtered_total": len(filtered),
+        "book_counts": [
+            {"book_name": name, "testament": books[name]["testament"], "count": count}
+            for name, count in sorted(
+                counts.items(), key=lambda item: (-item[1], books[item[0]]["position"]))
+        ],
+        "results": filtered if limit is None else filtered[:limit],
+    }
+
+
+def prewarm():
+    """Reads every table once so the file's pages are in the OS page cache."""
+    conn = _get_connection()
+    conn.execute("SELECT count(*), sum(length(text)), sum(length(tsv)) FROM verses").fetchone()
+    conn.execute("SELECT count(*) FROM lexicon").fetchone()
+    conn.execute("SELECT count(*) FROM verses_fts WHERE verses_fts MATCH 'lord'").fetchone()
+
+
+async def _run(function, *args):
+    """Runs a lookup in a worker thread; it counts as one query of the request."""
+    result = await asyncio.to_thread(function, *args)
+    count_query(len(result) if isinstance(result, list) else 1)
+    return result
+
+
+async def get_verses_by_book_and_chapter(book_name: str, chapter_number: int):
+    return await _run(_get_verses_by_book_and_chapter, book_name, chapter_number)
+
+
+async def get_verses_by_chapter_id(chapter_id: int):
+    return await _run(_get_verses_by_chapter_id, chapter_id)
+
+
+async def get_verses_by_ids(verse_ids: list):
+    return await _run(_get_verses_by_ids, verse_ids)
+
+
+async def get_scripture_catalog():
+    return await _run(_get_scripture_catalog)
+
+
+async def get_corpus_version():
+    return await _run(_get_corpus_version)
+
+
+async def get_term_frequencies():
+    return await _run(_get_term_frequencies)
+
+
+async def search_bible_text(search_query: str, limit: int = 50):
+    return await _run(_search_bible_text, search_query, limit)
+
+
+async def search_bible_advanced(parsed_query, limit: int = 50):
+    return await _run(_search_advanced, parsed_query, limit)
+
+
+async def search_bible_faceted(search_query: str, limit, book, testament, parsed_query=None):
+    return await _run(
+        _search_faceted, search_query, limit, book, testament, parsed_query)
@@ -0,0 +1,248 @@
+# app/search_query.py
+"""
+Parser for the advanced /search syntax.
+
+    "the lord is my shepherd"   phrase (words in this order, adjacent)
+    shepherd NEAR/3 still       both words within 3 positions, either order
+    shep*                       prefix
+    love AND (faith OR hope)    boolean operators, parentheses
+    NOT wrath, -wrath           exclusion
+
+Queries are parsed into a small tree and validated before anything reaches
+Postgres. Only word characters from the input are ever rendered into the
+tsquery text, and the tree's size is capped, so malformed or hostile input is
+rejected with a 400 instead of raising a tsquery syntax error or turning into
+an expensive scan.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Union
+
+MAX_QUERY_LENGTH = 200
+MAX_TERMS = 16
+MAX_PREFIX_TERMS = 4
+MIN_PREFIX_LENGTH = 3
+MAX_NEAR_DISTANCE = 10
+MAX_NESTING_DEPTH = 3
+
+_TOKEN_PATTERN = re.compile(
+    r'"(?P<phrase>[^"]*)"'
+    r'|(?P<unterminated>")'
+    r'|(?P<open>\()'
+    r'|(?P<close>\))'
+    r'|NEAR/(?P<near>\d+)'
+    r'|(?P<operator>\b(?:AND|OR|NOT)\b)'
+    r'|(?<![^\s(])(?P<negate>-)(?=[\w"(])'
+    r'|(?P<word>\w+)(?P<prefix>\*)?'
+)
+_ADVANCED_PATTERN = re.compile(r'["*()]|\bNEAR/\d|\b(?:AND|OR|NOT)\b|(?<![^\s(])-[\w"(]')
+
+
+class SearchQueryError(ValueError):
+    """Raised for advanced search queries that are malformed or too expensive."""
+
+
+@dataclass(frozen=True)
+class Term:
+    word: str
+    prefix: bool = False
+
+
+@dataclass(frozen=True)
+class Phrase:
+    words: tuple
+
+
+@dataclass(frozen=True)
+class Near:
+    left: Term
+    right: Term
+    distance: int
+
+
+@dataclass(frozen=True)
+class Not:
+    child: "SearchNode"
+
+
+@dataclass(frozen=True)
+class And:
+    children: tuple
+
+
+@dataclass(frozen=True)
+class Or:
+    children: tuple
+
+
+SearchNode = Union[Term, Phrase, Near, Not, And, Or]
+
+
+def is_advanced_query(query: str) -> bool:
+    """True if the query uses any advanced operator; plain queries keep the old search path."""
+    return bool(_ADVANCED_PATTERN.search(query))
+
+
+def _tokenize(query: str) -> List[tuple]:
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup if match.lastgroup != "prefix" else "word"
+        if kind == "phrase":
+            tokens.append(("phrase", match.group("phrase")))
+        elif kind == "unterminated":
+            raise SearchQueryError("Unterminated quote in search query")
+        elif kind == "near":
+            tokens.append(("near", int(match.group("near"))))
+        elif kind == "operator":
+            tokens.append((match.group("operator"), None))
+        elif kind in ("open", "close", "negate"):
+            tokens.append((kind, None))
+        else:
+            tokens.append(("word", (match.group("word").lower(), bool(match.group("prefix")))))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self) -> SearchNode:
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise SearchQueryError("Unexpected ')' in search query")
+        return node
+
+    def parse_or(self) -> SearchNode:
+        children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+
+    def parse_and(self) -> SearchNode:
+        children = [self.parse_unary()]
+        while self.peek() not in (None, "OR", "close"):
+            if self.peek() == "AND":
+                self.take()
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else And(tuple(children))
+
+    def parse_unary(self) -> SearchNode:
+        if self.peek() in ("NOT", "negate"):
+            self.take()
+            return Not(self.parse_unary())
+        return self.parse_near()
+
+    def parse_near(self) -> SearchNode:
+        left = self.parse_primary()
+        if self.peek() != "near":
+            return left
+        distance = self.take()[1]
+        right = self.parse_primary()
+        if not isinstance(left, Term) or not isinstance(right, Term):
+            raise SearchQueryError("NEAR/n can only join two single words")
+        if not 1 <= distance <= MAX_NEAR_DISTANCE:
+            raise SearchQueryError(f"NEAR distance must be between 1 and {MAX_NEAR_DISTANCE}")
+        return Near(left, right, distance)
+
+    def parse_primary(self) -> SearchNode:
+        kind = self.peek()
+        if kind is None:
+            raise SearchQueryError("Search query ends unexpectedly")
+        _, value = self.take()
+        if kind == "word":
+            word, prefix = value
+            return Term(word, prefix)
+        if kind == "phrase":
+            words = tuple(word.lower() for word in re.findall(r"\w+", value))
+            if not words:
+                raise SearchQueryError("Empty phrase in search query")
+            return Term(words[0]) if len(words) == 1 else Phrase(words)
+        if kind == "open":
+            self.depth += 1
+            if self.depth > MAX_NESTING_DEPTH:
+                raise SearchQueryError("Search query is nested too deeply")
+            node = self.parse_or()
+            if self.peek() != "close":
+                raise SearchQueryError("Missing ')' in search query")
+            self.take()
+            self.depth -= 1
+            return node
+        raise SearchQueryError(f"Unexpected '{kind}' in search query")
+
+
+def walk(node: SearchNode):
+    """Yields every node of a parsed query, depth first."""
+    yield node
+    if isinstance(node, Not):
+        yield from walk(node.child)
+    elif isinstance(node, (And, Or)):
+        for child in node.children:
+            yield from walk(child)
+    elif isinstance(node, Near):
+        yield node.left
+        yield node.right
+
+
+def _has_positive_match(node: SearchNode) -> bool:
+    # A branch made only of exclusions matches (almost) every verse and can't use the index
+    if isinstance(node, Not):
+        return False
+    if isinstance(node, And):
+        return any(_has_positive_match(child) for child in node.children)
+    if isinstance(node, Or):
+        return all(_has_positive_match(child) for child in node.children)
+    return True
+
+
+def parse_search_query(query: str) -> SearchNode:
+    """Parses and validates an advanced search query. Raises SearchQueryError."""
+    if len(query) > MAX_QUERY_LENGTH:
+        raise SearchQueryError(f"Search query is longer than {MAX_QUERY_LENGTH} characters")
+    tokens = _tokenize(query)
+    if not tokens:
+        raise SearchQueryError("Search query has no words")
+
+    node = _Parser(tokens).parse()
+
+    terms = [n for n in walk(node) if isinstance(n, Term)]
+    word_count = len(terms) + sum(len(n.words) for n in walk(node) if isinstance(n, Phrase))
+    if word_count > MAX_TERMS:
+        raise SearchQueryError(f"Search query has more than {MAX_TERMS} words")
+    prefixes = [term for term in terms if term.prefix]
+    if len(prefixes) > MAX_PREFIX_TERMS:
+        raise SearchQueryError(f"Search query has more than {MAX_PREFIX_TERMS} prefix terms")
+    if any(len(term.word) < MIN_PREFIX_LENGTH for term in prefixes):
+        raise SearchQueryError(f"Prefix terms need at least {MIN_PREFIX_LENGTH} letters")
+    if not _has_positive_match(node):
+        raise SearchQueryError("Search query must include at least one word that is not excluded")
+    return node
+
+
+def to_tsquery_text(node: SearchNode) -> str:
+    """Renders a parsed query as input for to_tsquery('english', ...)."""
+    if isinstance(node, Term):
+        return f"{node.word}:*" if node.prefix else node.word
+    if isinstance(node, Phrase):
+        return "(" + " <-> ".join(node.words) + ")"
+    if isinstance(node, Near):
+        left, right = to_tsquery_text(node.left), to_tsquery_text(node.right)
+        alternatives = []
+        for distance in range(1, node.distance + 1):
+            alternatives.append(f"{left} <{distance}> {right}")
+            alternatives.append(f"{right} <{distance}> {left}")
+        return "(" + " | ".join(alternatives) + ")"
+    if isinstance(node, Not):
+        return "!" + to_tsquery_text(node.child)
+    operator = " & " if isinstance(node, And) else " | "
+    return "(" + operator.join(to_tsquery_text(child) for child in node.children) + ")"
@@ -0,0 +1,112 @@
+# app/singleflight.py
+"""
+Single-flight coalescing for identical concurrent reads.
+
+While a call to a wrapped function is in flight, further calls with the same
+arguments wait for that call instead of starting their own query, and all of
+them get its result (or its exception). Nothing is kept after the call
+finishes, so this is not a cache: it only collapses bursts that arrive before
+any cache could be filled.
+
+The shared call runs as its own task and every caller awaits it through
+asyncio.shield, so one client disconnecting does not cancel the query for the
+others. The task is cancelled only when every caller waiting on it has been
+cancelled. Results are shared objects: callers must not mutate them.
+
+The task starts with a copy of the first caller's context, so the shared
+query runs under that caller's statement_timeout (its admission class, see
+app/admission.py) and logs with its request id; callers that join later get
+the same query, whatever their own timeout. Its database counts are kept
+apart and added to every waiting caller's request (app/query_counter.py).
+"""
+import asyncio
+import functools
+from typing import Dict
+from app.query_counter import QueryCounts, add_counts, counted_in
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "counts")
+
+    def __init__(self, task: asyncio.Task, counts: QueryCounts):
+        self.task = task
+        self.waiters = 0
+        self.counts = counts
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[tuple, _Call] = {}
+        # name -> {"calls", "coalesced", "errors", "cancelled"}
+        self.counters: Dict[str, dict] = {}
+
+    def _counter(self, name: str) -> dict:
+        return self.counters.setdefault(
+            name, {"calls": 0, "coalesced": 0, "errors": 0, "cancelled": 0})
+
+    def _forget(self, key: tuple, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def _finished(self, name: str, key: tuple, call: _Call):
+        self._forget(key, call)
+        # Counted once per shared call, however many callers it is raised to
+        if not call.task.cancelled() and call.task.exception() is not None:
+            self._counter(name)["errors"] += 1
+
+    async def do(self, name: str, key: tuple, func):
+        """Runs `func()` unless an identical call (same name and key) is already in flight."""
+        counter = self._counter(name)
+        counter["calls"] += 1
+        full_key = (name, key)
+
+        call = self._calls.get(full_key)
+        if call is None:
+            counts = QueryCounts()
+            call = _Call(asyncio.ensure_future(counted_in(counts, func())), counts)
+            self._calls[full_key] = call
+            call.task.add_done_callback(lambda _: self._finished(name, full_key, call))
+        else:
+            counter["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left waiting: stop the query, and don't let new callers join it
+                counter["cancelled"] += 1
+                self._forget(full_key, call)
+                call.task.cancel()
+            raise
+        except Exception:
+            add_counts(call.counts)
+            raise
+        add_counts(call.counts)
+        return result
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "functions": self.counters}
+
+
+read_flights = SingleFlight()
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+
+def single_flight(name: str):
+    """Decorator for read-only async crud functions with hashable (or list) arguments."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (_hashable(list(args)), _hashable(kwargs))
+            return await read_flights.do(name, key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
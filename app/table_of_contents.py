@@ -0,0 +1,98 @@
+# app/table_of_contents.py
+"""
+Table of contents: books, chapters per book and verses per chapter.
+
+Built once at startup from the scripture catalog. Every response the books
+routes can give is serialized ahead of time, together with a gzip copy
+(kept only when it is actually smaller) and an ETag, so a request is a
+dictionary lookup and a write of ready bytes.
+"""
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from app.crud import get_scripture_catalog
+from app.warmup import register_warmer
+
+
+@dataclass(frozen=True)
+class Payload:
+    body: bytes
+    gzip_body: Optional[bytes]
+    etag: str
+
+    @property
+    def gzip_etag(self) -> str:
+        # A different representation needs a different strong validator
+        return self.etag[:-1] + '-gzip"'
+
+
+def make_payload(content) -> Payload:
+    body = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    return Payload(
+        body=body,
+        gzip_body=compressed if len(compressed) < len(body) else None,
+        etag='"' + hashlib.sha1(body).hexdigest()[:16] + '"',
+    )
+
+
+def _chapter_ref(book: dict, chapter: dict) -> dict:
+    return {"book_name": book["name"], "chapter_number": chapter["chapter_number"]}
+
+
+class TableOfContents:
+    def __init__(self, catalog: dict):
+        chapters_by_book = {}
+        for chapter in catalog["chapters"]:
+            chapters_by_book.setdefault(chapter["book_id"], []).append(chapter)
+
+        books = []
+        for book in catalog["books"]:
+            chapters = chapters_by_book.get(book["id"], [])
+            books.append({
+                "name": book["name"],
+                "abbreviation": book["abbreviation"],
+                "testament": book["testament"],
+                "position": book["position"],
+                "chapter_count": len(chapters),
+                "verse_count": sum(chapter["verse_count"] for chapter in chapters),
+                "chapters": [
+                    {"chapter_number": chapter["chapter_number"], "verse_count": chapter["verse_count"]}
+                    for chapter in chapters
+                ],
+            })
+
+        self.contents = make_payload({"books": books})
+        self.books: Dict[str, Payload] = {book["name"]: make_payload(book) for book in books}
+
+        # Reading order across book boundaries, for prev/next
+        sequence = [(book, chapter) for book in books for chapter in book["chapters"]]
+        self.chapters: Dict[Tuple[str, int], Payload] = {}
+        for index, (book, chapter) in enumerate(sequence):
+            previous = sequence[index - 1] if index > 0 else None
+            following = sequence[index + 1] if index + 1 < len(sequence) else None
+            self.chapters[(book["name"], chapter["chapter_number"])] = make_payload({
+                "book_name": book["name"],
+                "testament": book["testament"],
+                "chapter_number": chapter["chapter_number"],
+                "verse_count": chapter["verse_count"],
+                "book_chapter_count": book["chapter_count"],
+                "prev": _chapter_ref(*previous) if previous else None,
+                "next": _chapter_ref(*following) if following else None,
+            })
+
+
+_contents: Optional[TableOfContents] = None
+
+
+def get_table_of_contents() -> Optional[TableOfContents]:
+    """The startup-built table of contents, or None if it hasn't been built (yet)."""
+    return _contents
+
+
+@register_warmer("table_of_contents")
+async def build_table_of_contents():
+    global _contents
+    _contents = TableOfContents(await get_scripture_catalog())
@@ -0,0 +1,75 @@
+# app/testing.py
+"""
+Query budgets for tests: fail when an endpoint starts making more database
+round trips than it should (an N+1 loop, a read-back after a write).
+
+Load the fixture in a conftest.py and check responses against a budget:
+
+    pytest_plugins = ["app.testing"]
+
+    def test_today_is_one_query(client, query_budget):
+        response = client.get("/devotionals/today")
+        query_budget(response, queries=1, connections=1)
+
+or keep the budgets in one place:
+
+    BUDGETS = {"/devotionals/today": QueryBudget(queries=1, connections=1)}
+    ...
+    assert_query_budget(response, **BUDGETS[path]._asdict())
+
+The counts come from the X-DB-* headers QueryCounterMiddleware adds
+(app/query_counter.py); the fixture switches them on for the test. BEGIN
+and COMMIT count as queries; statement_timeout and the pool's reset come
+with each connection and are left out. The suite's own budgets are in
+tests/test_query_budgets.py.
+"""
+from typing import NamedTuple, Optional
+import pytest
+from app import query_counter
+from app.query_counter import QueryCounts
+
+
+class QueryBudget(NamedTuple):
+    queries: int
+    connections: Optional[int] = None
+    rows: Optional[int] = None
+
+
+def response_counts(response) -> QueryCounts:
+    """The database counts a response reports in its X-DB-* headers."""
+    try:
+        return QueryCounts(
+            connections=int(response.headers["x-db-connections"]),
+            queries=int(response.headers["x-db-queries"]),
+            rows=int(response.headers["x-db-rows"]),
+        )
+    except KeyError:
+        raise AssertionError(
+            "Response has no X-DB-* headers: use the query_budget fixture, "
+            "or set DEBUG_DB_HEADERS=1") from None
+
+
+def assert_query_budget(response, queries: int, connections: Optional[int] = None,
+                        rows: Optional[int] = None) -> QueryCounts:
+    """Fails if the request behind `response` went over any of the given limits."""
+    counts = response_counts(response)
+    over = [
+        f"{name} {used} > {limit}"
+        for name, used, limit in (
+            ("queries", counts.queries, queries),
+            ("connections", counts.connections, connections),
+            ("rows", counts.rows, rows),
+        )
+        if limit is not None and used > limit
+    ]
+    if over:
+        request = response.request
+        raise AssertionError(f"{request.method} {request.url.path} is over its query budget: {', '.join(over)}")
+    return counts
+
+
+@pytest.fixture
+def query_budget(monkeypatch):
+    """Turns on the X-DB-* headers and returns assert_query_budget."""
+    monkeypatch.setattr(query_counter, "expose_headers", True)
+    return assert_query_budget
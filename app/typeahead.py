@@ -0,0 +1,116 @@
+# app/typeahead.py
+"""
+In-memory typeahead dictionaries for the search box.
+
+Two sorted dictionaries are built at startup: every word in the verses with
+its number of occurrences, and every book name, abbreviation and alias from
+the book resolver. Completions are answered from memory with bisect over the
+sorted keys; the top-k lists for short prefixes (where ranges are large) are
+precomputed so every lookup stays in the microsecond range.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from typing import List, Optional
+from app.book_resolver import get_book_resolver, normalize_book_name
+from app.crud import get_term_frequencies
+from app.warmup import register_warmer
+
+MAX_COMPLETIONS = 20
+# Prefixes up to this length get their top-k precomputed
+PRECOMPUTED_PREFIX_LENGTH = 3
+
+# "john 3" / "1 cor 1" -> book part and chapter prefix
+_REFERENCE_PATTERN = re.compile(r"^(.*\S)\s+(\d{1,3})$")
+
+
+def _prefix_range(keys: list, prefix: str):
+    return bisect_left(keys, prefix), bisect_left(keys, prefix + "\uffff")
+
+
+class TermIndex:
+    def __init__(self, frequencies):
+        entries = sorted(frequencies)
+        self.terms = [term for term, _ in entries]
+        self.counts = [count for _, count in entries]
+
+        self._top = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+            buckets = {}
+            for i, term in enumerate(self.terms):
+                if len(term) >= length:
+                    buckets.setdefault(term[:length], []).append(i)
+            for prefix, indexes in buckets.items():
+                self._top[prefix] = heapq.nlargest(
+                    MAX_COMPLETIONS, indexes, key=self.counts.__getitem__)
+
+    def complete(self, prefix: str, k: int) -> List[tuple]:
+        """Top-k (term, occurrences) starting with `prefix`, most frequent first."""
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            indexes = self._top.get(prefix, [])[:k]
+        else:
+            start, end = _prefix_range(self.terms, prefix)
+            indexes = heapq.nlargest(k, range(start, end), key=self.counts.__getitem__)
+        return [(self.terms[i], self.counts[i]) for i in indexes]
+
+
+class ReferenceIndex:
+    def __init__(self, resolver):
+        self.resolver = resolver
+        entries = sorted(resolver.lookup_keys(), key=lambda entry: entry[0])
+        self.keys = [key for key, _ in entries]
+        self.books = [book for _, book in entries]
+
+    def complete(self, text: str, k: int) -> List[dict]:
+        """Book completions for a partial name, or chapter completions for "<book> <digits>"."""
+        match = _REFERENCE_PATTERN.match(text.strip())
+        if match:
+            book = self.resolver.resolve(match.group(1))
+            if book is not None:
+                digits = match.group(2)
+                chapters = [n for n in sorted(book.chapter_ids) if str(n).startswith(digits)]
+                return [
+                    {"label": f"{book.name} {n}", "book": book.name, "chapter": n}
+                    for n in chapters[:k]
+                ]
+
+        key = normalize_book_name(text)
+        if not key:
+            return []
+        start, end = _prefix_range(self.keys, key)
+        books = {book.id: book for book in self.books[start:end]}
+        ordered = sorted(books.values(), key=lambda book: book.position)
+        return [{"label": book.name, "book": book.name, "chapter": None} for book in ordered[:k]]
+
+
+_term_index: Optional[TermIndex] = None
+_reference_index: Optional[ReferenceIndex] = None
+
+
+def is_loaded() -> bool:
+    return _term_index is not None
+
+
+def complete(text: str, k: int) -> dict:
+    """Reference and search-term completions for what's typed so far."""
+    # Only the word being typed is completed; a trailing space means it's finished
+    words = text.split()
+    last_word = "" if not words or text[-1].isspace() else words[-1]
+    lead = text[:len(text) - len(last_word)]
+    prefix = re.sub(r"\W", "", last_word.lower())
+    terms = _term_index.complete(prefix, k) if prefix else []
+    return {
+        "references": _reference_index.complete(text, k) if _reference_index else [],
+        "terms": [
+            {"term": term, "count": count, "completion": lead + term}
+            for term, count in terms
+        ],
+    }
+
+
+@register_warmer("typeahead")
+async def build_typeahead_index():
+    global _term_index, _reference_index
+    _term_index = TermIndex(await get_term_frequencies())
+    resolver = get_book_resolver()
+    _reference_index = ReferenceIndex(resolver) if resolver else None
@@ -0,0 +1,129 @@
+# app/verse_of_day.py
+"""
+Verse of the day from a deterministic schedule.
+
+The verse for a calendar date comes from VOTD_SCHEDULE_FILE if it lists that
+date, otherwise from a seeded shuffle of DEFAULT_VOTD_REFERENCES (every
+reference once per cycle, same order on every worker and every restart).
+A rolling window of dates is resolved and serialized ahead of time, so the
+endpoint answers from memory; the window starts yesterday because "today"
+depends on the client's timezone.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+from app.book_resolver import get_book_resolver
+from app.config import VOTD_SEED, VOTD_SCHEDULE_FILE, VOTD_WINDOW_DAYS
+from app.crud import get_verses_by_chapter_id
+from app.warmup import register_warmer
+from app.scheduler import scheduled_job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOTD_REFERENCES = [
+    "John 3:16", "Psalms 23:1", "Philippians 4:13", "Jeremiah 29:11",
+    "Romans 8:28", "Proverbs 3:5", "Proverbs 3:6", "Isaiah 40:31",
+    "Joshua 1:9", "Psalms 46:1", "Matthew 11:28", "Romans 12:2",
+    "2 Corinthians 5:17", "Galatians 5:22", "Ephesians 2:8", "Hebrews 11:1",
+    "1 Corinthians 13:4", "Psalms 119:105", "Isaiah 41:10", "Matthew 6:33",
+    "Psalms 37:4", "Lamentations 3:22", "Lamentations 3:23", "Micah 6:8",
+    "John 14:6", "John 16:33", "Romans 5:8", "Romans 15:13",
+    "2 Timothy 1:7", "James 1:5", "1 Peter 5:7", "1 John 4:19",
+    "Psalms 27:1", "Psalms 34:8", "Psalms 91:1", "Psalms 121:1",
+    "Psalms 139:14", "Isaiah 26:3", "Isaiah 53:5", "Zephaniah 3:17",
+    "Matthew 5:16", "Matthew 28:20", "John 1:5", "John 15:5",
+    "Colossians 3:23", "Hebrews 13:8", "Revelation 21:4", "Deuteronomy 31:6",
+]
+
+# How often the window is rolled forward
+REFRESH_INTERVAL_SECONDS = 3600
+
+_REFERENCE_PATTERN = re.compile(r"^(.*\S)\s+(\d+):(\d+)$")
+
+# date -> {"entry": dict, "body": bytes, "etag": str, "scheduled": the schedule's reference}
+_window: Dict[date, dict] = {}
+
+
+def load_schedule() -> Dict[date, str]:
+    if not VOTD_SCHEDULE_FILE:
+        return {}
+    with open(VOTD_SCHEDULE_FILE, encoding="utf-8") as f:
+        return {date.fromisoformat(day): reference for day, reference in json.load(f).items()}
+
+
+def scheduled_reference(day: date, schedule: Dict[date, str]) -> str:
+    """The reference shown on `day`: curated if listed, otherwise the seeded rotation."""
+    if day in schedule:
+        return schedule[day]
+    references = DEFAULT_VOTD_REFERENCES
+    cycle, offset = divmod(day.toordinal(), len(references))
+    order = random.Random(f"{VOTD_SEED}:{cycle}").sample(range(len(references)), len(references))
+    return references[order[offset]]
+
+
+async def _resolve_reference(reference: str) -> Optional[dict]:
+    match = _REFERENCE_PATTERN.match(reference.strip())
+    resolver = get_book_resolver()
+    if match is None or resolver is None:
+        return None
+    book, chapter_id = resolver.resolve_chapter(match.group(1), int(match.group(2)))
+    if chapter_id is None:
+        return None
+    verse_number = int(match.group(3))
+    for verse in await get_verses_by_chapter_id(chapter_id):
+        if verse["verse_number"] == verse_number:
+            return {
+                "id": verse["id"],
+                "reference": f"{book.name} {match.group(2)}:{verse_number}",
+                "book_name": book.name,
+                "chapter_number": int(match.group(2)),
+                "verse_number": verse_number,
+                "text": verse["text"],
+            }
+    return None
+
+
+async def refresh_window(today: Optional[date] = None):
+    """Resolves yesterday through VOTD_WINDOW_DAYS ahead and drops older days."""
+    today = today or datetime.now(timezone.utc).date()
+    schedule = load_schedule()
+    days = [today + timedelta(days=n) for n in range(-1, VOTD_WINDOW_DAYS + 1)]
+
+    window = {}
+    for day in days:
+        reference = scheduled_reference(day, schedule)
+        # Reuse a resolved day unless the schedule file now says otherwise
+        cached = _window.get(day)
+        if cached is not None and cached["scheduled"] == reference:
+            window[day] = cached
+            continue
+        verse = await _resolve_reference(reference)
+        if verse is None:
+            logger.warning("Verse of the day for %s: cannot resolve %r", day, reference)
+            continue
+        entry = {"date": day.isoformat(), **verse}
+        body = json.dumps(entry, separators=(",", ":")).encode()
+        window[day] = {
+            "entry": entry,
+            "body": body,
+            "etag": '"' + hashlib.sha1(body).hexdigest()[:16] + '"',
+            "scheduled": reference,
+        }
+
+    _window.clear()
+    _window.update(window)
+
+
+def get_verse_of_the_day(day: date) -> Optional[dict]:
+    """Precomputed {"entry", "body", "etag"} for `day`, or None outside the window."""
+    return _window.get(day)
+
+
+@register_warmer("verse_of_the_day")
+@scheduled_job("verse_of_the_day", REFRESH_INTERVAL_SECONDS)
+async def refresh_verse_of_the_day():
+    await refresh_window()
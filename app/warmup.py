@@ -0,0 +1,148 @@
+# app/warmup.py
+"""
+Startup warmup.
+
+A freshly started worker opens its pools, runs the hot scripture statements on
+every pooled connection (filling asyncpg's statement cache), pages the verse
+and search indexes into Postgres' shared buffers and prefills the in-process
+caches registered with `register_warmer`. `/ready` reports not-ready until
+this has finished, so load balancers only route to warm workers.
+"""
+import asyncio
+import logging
+import time
+from app.config import SCRIPTURE_BACKEND
+from app import crud, scripture_sqlite
+from app.database import init_pools, close_pools, db_connection, for_each_pooled_connection
+
+logger = logging.getLogger(__name__)
+
+# Relations paged into shared buffers with pg_prewarm when the extension is installed
+PREWARM_RELATIONS = (
+    "books",
+    "chapters",
+    "verses",
+    "idx_verses_chapter_id",
+    "verses_chapter_id_verse_number_key",
+    "idx_verses_text_search",
+)
+
+warmup_state = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "preloaded": [],
+    "steps": {},
+}
+
+# (name, async callable) cache warmers, run after the database steps
+_cache_warmers = []
+# Warmers already run by the launcher's parent process (see preload)
+_preloaded = set()
+
+
+def register_warmer(name: str):
+    """Decorator: registers an async function that prefills an in-process cache."""
+    def decorator(func):
+        _cache_warmers.append((name, func))
+        return func
+    return decorator
+
+
+def is_ready() -> bool:
+    return warmup_state["ready"]
+
+
+async def _open_pools():
+    # The database may come up after the app; keep retrying instead of giving up
+    delay = 1
+    while True:
+        try:
+            await init_pools()
+            return
+        except Exception as e:
+            logger.warning("Warmup could not open database pools (retrying in %ss): %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+async def _run_hot_statements(conn):
+    await conn.fetch(crud.VERSES_BY_CHAPTER_QUERY, "Genesis", 1)
+    await conn.fetch(crud.VERSES_BY_CHAPTER_ID_QUERY, 1)
+    await conn.fetch(crud.FULL_TEXT_SEARCH_QUERY, "love", 1)
+    await conn.fetch(crud.ILIKE_SEARCH_QUERY, "% love %", 1)
+
+
+async def _prepare_statements():
+    await for_each_pooled_connection(_run_hot_statements, readonly=True)
+
+
+async def _prewarm_buffers():
+    async with db_connection(readonly=True) as conn:
+        has_pg_prewarm = await conn.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm')")
+        if not has_pg_prewarm:
+            logger.info("pg_prewarm extension not installed; skipping buffer prewarm")
+            return
+        for relation in PREWARM_RELATIONS:
+            if await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", relation):
+                await conn.fetchval("SELECT pg_prewarm($1::regclass)", relation)
+
+
+async def _prewarm_sqlite():
+    await asyncio.to_thread(scripture_sqlite.prewarm)
+
+
+async def run_warmup():
+    warmup_state["started_at"] = time.time()
+
+    steps = [("pools", _open_pools)]
+    if SCRIPTURE_BACKEND == "sqlite":
+        steps.append(("sqlite_pages", _prewarm_sqlite))
+    else:
+        steps.append(("statements", _prepare_statements))
+        steps.append(("buffers", _prewarm_buffers))
+    steps.extend((name, step) for name, step in _cache_warmers if name not in _preloaded)
+
+    for name, step in steps:
+        started = time.monotonic()
+        error = None
+        try:
+            await step()
+        except Exception as e:
+            # A failed warmup step only leaves something cold; it must not keep the worker out
+            logger.warning("Warmup step %s failed: %s", name, e)
+            error = str(e)
+        warmup_state["steps"][name] = {
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "error": error,
+        }
+
+    warmup_state["finished_at"] = time.time()
+    warmup_state["ready"] = True
+    logger.info("Warmup finished in %.2fs",
+                warmup_state["finished_at"] - warmup_state["started_at"])
+
+
+async def preload(names):
+    """
+    Runs the named cache warmers (and pages in the SQLite file) in the
+    launcher's parent before it forks, then closes the pools: connections must
+    not be shared across fork. Workers inherit the caches copy-on-write and
+    skip those warmers.
+    """
+    if SCRIPTURE_BACKEND == "sqlite":
+        await _prewarm_sqlite()
+    try:
+        for name, warmer in _cache_warmers:
+            if name not in names:
+                continue
+            try:
+                await warmer()
+            except Exception as e:
+                logger.warning("Preloading %s failed, workers will build it themselves: %s", name, e)
+            else:
+                _preloaded.add(name)
+    finally:
+        await close_pools()
+    warmup_state["preloaded"] = sorted(_preloaded)
@@ -0,0 +1,125 @@
+"""
+Overhead of the logging setup in app/logging_setup.py.
+
+    python benchmarks/bench_logging.py [records]
+
+Compares the time a log call costs the calling thread (i.e. the event loop)
+with a plain synchronous StreamHandler versus the queue handler, writing to
+a fast file and to a stream that stalls on every write (a slow disk or a
+blocked pipe). Also times RequestLoggingMiddleware around a trivial ASGI app
+with and without access-log sampling.
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import logging_setup  # noqa: E402
+from app.logging_setup import JsonFormatter, RequestIdFilter, RequestLoggingMiddleware  # noqa: E402
+
+RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+REQUESTS = 20000
+# Stall per write for the "slow stream" runs
+STALL_SECONDS = 0.0002
+
+
+class StallingStream:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        time.sleep(STALL_SECONDS)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def log_records(logger: logging.Logger, count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        logger.info("Fetched chapter %s of %s", i % 150, "Psalms", extra={"duration_ms": 1.25})
+    return time.perf_counter() - started
+
+
+def bench_sync(stream, count: int) -> float:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(RequestIdFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(logging.INFO)
+    return log_records(logging.getLogger("bench"), count)
+
+
+def bench_queue(stream, count: int):
+    """Returns (caller seconds, seconds until the writer thread caught up, dropped)."""
+    logging_setup.setup_logging(stream)
+    caller = log_records(logging.getLogger("bench"), count)
+    started = time.perf_counter()
+    dropped = logging_setup.logging_stats()["dropped"]
+    logging_setup.stop_logging()
+    return caller, time.perf_counter() - started, dropped
+
+
+async def bench_middleware(sample_rate, count: int) -> float:
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    wrapped = app if sample_rate is None else RequestLoggingMiddleware(app)
+    logging_setup._sample_rates = [("/", sample_rate or 0.0)]
+    scope = {"type": "http", "method": "GET", "path": "/verses/Psalms/23", "headers": []}
+    started = time.perf_counter()
+    for _ in range(count):
+        await wrapped(scope, receive, send)
+    return time.perf_counter() - started
+
+
+def per_call_us(seconds: float, count: int) -> str:
+    return f"{seconds / count * 1e6:8.2f} us"
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        def open_log(name):
+            return open(os.path.join(directory, name), "w", encoding="utf-8")
+
+        print(f"{RECORDS} records, caller-side cost per log call:")
+        with open_log("sync.log") as f:
+            print(f"  sync handler, file          {per_call_us(bench_sync(f, RECORDS), RECORDS)}")
+        with open_log("sync-slow.log") as f:
+            slow_count = max(1, RECORDS // 20)
+            seconds = bench_sync(StallingStream(f), slow_count)
+            print(f"  sync handler, stalling      {per_call_us(seconds, slow_count)}")
+        with open_log("queue.log") as f:
+            caller, drain, dropped = bench_queue(f, RECORDS)
+            print(f"  queue handler, file         {per_call_us(caller, RECORDS)}"
+                  f"  (writer caught up {drain * 1000:.0f} ms later, {dropped} dropped)")
+        with open_log("queue-slow.log") as f:
+            caller, drain, dropped = bench_queue(StallingStream(f), RECORDS)
+            print(f"  queue handler, stalling     {per_call_us(caller, RECORDS)}"
+                  f"  (writer caught up {drain * 1000:.0f} ms later, {dropped} dropped)")
+
+        print(f"{REQUESTS} requests through a trivial ASGI app, cost per request:")
+        with open_log("access.log") as f:
+            logging_setup.setup_logging(f)
+            for label, rate in (("no middleware", None), ("middleware, log all", 1.0),
+                                ("middleware, 1% sampled", 0.01)):
+                seconds = asyncio.run(bench_middleware(rate, REQUESTS))
+                print(f"  {label:<27} {per_call_us(seconds, REQUESTS)}")
+            logging_setup.stop_logging()
+
+
+if __name__ == "__main__":
+    main()
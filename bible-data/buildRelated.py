@@ -0,0 +1,146 @@
+import os
+import re
+import struct
+import sys
+import time
+import numpy as np
+import psycopg2
+from scipy import sparse
+from importBible import DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+
+# Neighbor table read by app/related.py (RELATED_VERSES_PATH)
+RELATED_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "related_verses.bin")
+
+# Must match app/related.py: file header and layout
+RELATED_MAGIC = b"RELV"
+RELATED_VERSION = 1
+HEADER_FORMAT = "<4sIII"
+
+# Neighbors kept per verse
+TOP_K = 10
+# Rows of the similarity matrix computed at once (BLOCK_SIZE x verses float32)
+BLOCK_SIZE = 256
+
+TSVECTOR_ENTRY_PATTERN = re.compile(r"'((?:[^']|'')*)':([0-9A-D,]+)")
+
+
+def load_verse_terms(conn):
+    """
+    Returns (verse ids, per-verse {lexeme: occurrences}). Uses Postgres' own
+    to_tsvector('english', ...) so terms are stemmed and stopwords dropped
+    exactly as in full-text search.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, to_tsvector('english', text)::text FROM verses ORDER BY id")
+    verse_ids, documents = [], []
+    for verse_id, tsvector_text in cursor.fetchall():
+        verse_ids.append(verse_id)
+        documents.append({
+            lexeme: positions.count(",") + 1
+            for lexeme, positions in TSVECTOR_ENTRY_PATTERN.findall(tsvector_text)
+        })
+    return verse_ids, documents
+
+
+def tfidf_matrix(documents):
+    """L2-normalised sparse TF-IDF rows (sublinear tf, smoothed idf), float32."""
+    vocabulary = {}
+    rows, cols, counts = [], [], []
+    for row, document in enumerate(documents):
+        for lexeme, count in document.items():
+            rows.append(row)
+            cols.append(vocabulary.setdefault(lexeme, len(vocabulary)))
+            counts.append(count)
+
+    tf = sparse.csr_matrix(
+        (1.0 + np.log(np.array(counts, dtype=np.float32)), (rows, cols)),
+        shape=(len(documents), len(vocabulary)), dtype=np.float32)
+    df = np.bincount(cols, minlength=len(vocabulary))
+    idf = (np.log((1.0 + len(documents)) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    matrix = tf @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix, dtype=np.float32), len(vocabulary)
+
+
+def top_k_neighbors(matrix, k):
+    """
+    Cosine top-k for every row, computed block by block on the CPU so memory
+    stays at BLOCK_SIZE x verses floats. Returns (row indexes, scores); rows
+    with fewer than k non-zero neighbors are padded with index -1.
+    """
+    count = matrix.shape[0]
+    transposed = matrix.T.tocsc()
+    neighbors = np.full((count, k), -1, dtype=np.int64)
+    scores = np.zeros((count, k), dtype=np.float32)
+
+    for start in range(0, count, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, count)
+        similarities = (matrix[start:end] @ transposed).toarray()
+        # A verse is not related to itself
+        similarities[np.arange(end - start), np.arange(start, end)] = 0.0
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        top[top_scores <= 0] = -1
+        neighbors[start:end] = top
+        scores[start:end] = np.where(top_scores > 0, top_scores, 0.0)
+
+    return neighbors, scores
+
+
+def write_related_file(path, verse_ids, neighbors, scores, k):
+    """Writes the neighbor table as little-endian int32/float32 arrays, replacing `path` atomically."""
+    ids = np.asarray(verse_ids, dtype="<i4")
+    neighbor_ids = np.where(neighbors >= 0, ids[np.maximum(neighbors, 0)], 0).astype("<i4")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack(HEADER_FORMAT, RELATED_MAGIC, RELATED_VERSION, k, len(ids)))
+        f.write(ids.tobytes())
+        f.write(neighbor_ids.tobytes())
+        f.write(scores.astype("<f4").tobytes())
+    os.replace(tmp_path, path)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else RELATED_FILE_PATH
+    try:
+        conn = psycopg2.connect(
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT
+        )
+    except psycopg2.Error as e:
+        print(f"Database connection error: {e}")
+        return
+
+    try:
+        started = time.perf_counter()
+        verse_ids, documents = load_verse_terms(conn)
+        loaded = time.perf_counter()
+
+        matrix, vocabulary_size = tfidf_matrix(documents)
+        neighbors, scores = top_k_neighbors(matrix, TOP_K)
+        computed = time.perf_counter()
+
+        write_related_file(path, verse_ids, neighbors, scores, TOP_K)
+    finally:
+        conn.close()
+
+    print(f"Related verses written to {path}")
+    print(f"  {len(verse_ids)} verses, {vocabulary_size} terms, {matrix.nnz} non-zero weights, top {TOP_K}")
+    print(f"  load {loaded - started:.1f}s, tf-idf + neighbors {computed - loaded:.1f}s "
+          f"(CPU, {BLOCK_SIZE}-row blocks)")
+    print(f"  index size {os.path.getsize(path) / (1024 * 1024):.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
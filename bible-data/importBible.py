@@ -1,5 +1,7 @@
 import os
+import re
 import csv
+import sqlite3
 import psycopg2
 from psycopg2.extras import execute_values
 
@@ -13,6 +15,12 @@ DB_PORT = "5432"
 # Path to your CSV file
 CSV_FILE_PATH = "/Users/junpark/Desktop/Code_Projects/bible-api/bible-data/asv/asv.csv"
 
+# Read-only scripture file served when the app runs with SCRIPTURE_BACKEND=sqlite
+SQLITE_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripture.sqlite3")
+
+# Must match app/scripture_sqlite.py: how query words are split and lexemes encoded for FTS5
+WORD_PATTERN = re.compile(r"\w+")
+
 def create_tables(conn):
     """Create the necessary tables in PostgreSQL based on the updated schema"""
     cursor = conn.cursor()
@@ -124,8 +132,8 @@ def create_tables(conn):
     -- Full-text search index
     CREATE INDEX idx_verses_text_search ON verses USING GIN (to_tsvector('english', text));
     
-    -- Create a view for Bible statistics
-    CREATE VIEW bible_stats AS
+    -- Bible statistics; materialized and refreshed by the app's scheduler
+    CREATE MATERIALIZED VIEW bible_stats AS
     SELECT 
         COUNT(*) as total_verses,
         COUNT(DISTINCT chapter_id) as total_chapters,
@@ -136,6 +144,9 @@ def create_tables(conn):
         chapters c ON v.chapter_id = c.id
     JOIN 
         books b ON c.book_id = b.id;
+
+    -- REFRESH ... CONCURRENTLY needs a unique index (the view has one row)
+    CREATE UNIQUE INDEX idx_bible_stats_singleton ON bible_stats (total_verses);
     """)
     
     conn.commit()
@@ -307,8 +318,21 @@ def main():
         create_search_function(conn)
         # Create the function to track reading progress
         create_progress_function(conn)
+        # Index devotional reflections for per-user full-text search
+        create_devotional_search_index(conn)
+        # Submission time of each entry's content, for ordering autosave drafts
+        create_devotional_submitted_at_column(conn)
+        # Aggregates kept fresh by the app's background scheduler
+        create_summary_tables(conn)
+        # Per-user devotional streaks and counts, updated on every save
+        create_devotional_stats_table(conn)
+        # Time-bucketed favorite counts for the popular-verses endpoint
+        create_favorite_buckets_table(conn)
 
         print("Functions created successfully!")
+
+        # Export the read-only SQLite backend for the verse and search routes
+        build_sqlite_backend(conn, SQLITE_FILE_PATH)
             
     except psycopg2.Error as e:
         print(f"Database connection error: {e}")
@@ -317,7 +341,12 @@ def main():
             conn.close()
 
 def create_search_function(conn):
-    """Create the full-text search function in PostgreSQL"""
+    """
+    Create the full-text search function in PostgreSQL.
+
+    Uses websearch_to_tsquery, which never raises on user input (to_tsquery
+    errors on stray operators such as 'love &').
+    """
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -336,7 +365,7 @@ def create_search_function(conn):
             c.chapter_number,
             v.verse_number,
             v.text AS verse_text,
-            ts_rank(to_tsvector('english', v.text), to_tsquery('english', search_query))::double precision AS rank
+            ts_rank(to_tsvector('english', v.text), websearch_to_tsquery('english', search_query))::double precision AS rank
         FROM 
             verses v
         JOIN 
@@ -344,7 +373,7 @@ def create_search_function(conn):
         JOIN 
             books b ON c.book_id = b.id
         WHERE 
-            to_tsvector('english', v.text) @@ to_tsquery('english', search_query)
+            to_tsvector('english', v.text) @@ websearch_to_tsquery('english', search_query)
         ORDER BY 
             rank DESC;
     END;
@@ -353,6 +382,46 @@ def create_search_function(conn):
     
     conn.commit()
 
+def create_devotional_search_index(conn):
+    """
+    Index devotional reflections for /devotionals/search.
+
+    A stored tsvector column plus a composite GIN index on (user_id,
+    reflection_tsv): btree_gin lets the user_id equality and the full-text
+    match be answered from one index scan, so a search only ever touches the
+    current user's entries.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gin;")
+    cursor.execute("""
+    ALTER TABLE devotionals
+        ADD COLUMN IF NOT EXISTS reflection_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(reflection, ''))) STORED;
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_devotionals_user_reflection_tsv
+        ON devotionals USING gin (user_id, reflection_tsv);
+    """)
+
+    conn.commit()
+
+def create_devotional_submitted_at_column(conn):
+    """
+    Add devotionals.submitted_at: when the stored content was submitted, by
+    the app server's clock (updated_at is the database's commit time). An
+    autosave draft only overwrites an entry whose content was submitted
+    before it, however late the draft is flushed.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+    ALTER TABLE devotionals
+        ADD COLUMN IF NOT EXISTS submitted_at TIMESTAMPTZ;
+    """)
+
+    conn.commit()
+
 def create_progress_function(conn):
     """Create the function to track reading progress"""
     cursor = conn.cursor()
@@ -433,5 +502,249 @@ def create_progress_function(conn):
     
     conn.commit()
 
+def create_devotional_stats_table(conn):
+    """
+    Create the per-user devotional summary (streaks, totals, per-month counts)
+    that save_current_devotional keeps up to date, and fill it for users who
+    already have devotionals.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS devotional_stats (
+        user_id INTEGER PRIMARY KEY,
+        total_entries INTEGER NOT NULL DEFAULT 0,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        longest_streak INTEGER NOT NULL DEFAULT 0,
+        first_entry_date DATE,
+        last_entry_date DATE,
+        monthly_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # Same gaps-and-islands computation as app/crud.py DEVOTIONAL_STATS_REBUILD_QUERY, for every user
+    cursor.execute("""
+    WITH days AS (
+        SELECT
+            user_id,
+            devotional_date AS day,
+            devotional_date - (row_number() OVER (PARTITION BY user_id ORDER BY devotional_date))::int AS island
+        FROM devotionals
+    ),
+    islands AS (
+        SELECT user_id, max(day) AS last_day, count(*) AS length
+        FROM days
+        GROUP BY user_id, island
+    ),
+    months AS (
+        SELECT user_id, jsonb_object_agg(month, entries) AS monthly_counts
+        FROM (
+            SELECT user_id, to_char(day, 'YYYY-MM') AS month, count(*) AS entries
+            FROM days
+            GROUP BY 1, 2
+        ) per_month
+        GROUP BY user_id
+    )
+    INSERT INTO devotional_stats (
+        user_id, total_entries, current_streak, longest_streak,
+        first_entry_date, last_entry_date, monthly_counts
+    )
+    SELECT
+        d.user_id,
+        count(*),
+        (SELECT length FROM islands i WHERE i.user_id = d.user_id ORDER BY last_day DESC LIMIT 1),
+        (SELECT max(length) FROM islands i WHERE i.user_id = d.user_id),
+        min(d.day),
+        max(d.day),
+        m.monthly_counts
+    FROM days d
+    JOIN months m ON m.user_id = d.user_id
+    GROUP BY d.user_id, m.monthly_counts
+    ON CONFLICT (user_id) DO NOTHING;
+    """)
+
+    conn.commit()
+
+def create_favorite_buckets_table(conn):
+    """
+    Create the per-day favorite counts behind the popular-verses endpoint:
+    how many devotionals dated `day` have `verse_id` as a favorite.
+    save_current_devotional adjusts them in its own transaction; old days are
+    pruned by the app's scheduler. Filled from the existing favorites once,
+    when the table is still empty.
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS favorite_verse_daily (
+        verse_id INTEGER NOT NULL REFERENCES verses(id),
+        day DATE NOT NULL,
+        favorites INTEGER NOT NULL,
+        PRIMARY KEY (day, verse_id)
+    );
+
+    INSERT INTO favorite_verse_daily (verse_id, day, favorites)
+    SELECT dfv.verse_id, d.devotional_date, count(*)
+    FROM devotional_favorite_verses dfv
+    JOIN devotionals d ON d.devotional_id = dfv.devotional_id
+    WHERE NOT EXISTS (SELECT 1 FROM favorite_verse_daily)
+    GROUP BY dfv.verse_id, d.devotional_date;
+
+    -- The popular-verses distinct-user check looks favorites up by verse
+    CREATE INDEX IF NOT EXISTS idx_devotional_favorite_verses_verse
+        ON devotional_favorite_verses (verse_id);
+    """)
+
+    conn.commit()
+
+def create_summary_tables(conn):
+    """
+    Create the aggregates refreshed by the app's background scheduler
+    (app/scheduler.py) instead of being recomputed on every request:
+
+    - bible_stats: materialized (older databases have it as a plain view)
+
+    user_reading_totals and favorite_verse_totals, which nothing read, are
+    dropped (favorite counts live in favorite_verse_daily).
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_views WHERE viewname = 'bible_stats') THEN
+            DROP VIEW bible_stats;
+        END IF;
+    END
+    $$;
+
+    CREATE MATERIALIZED VIEW IF NOT EXISTS bible_stats AS
+    SELECT
+        COUNT(*) as total_verses,
+        COUNT(DISTINCT chapter_id) as total_chapters,
+        COUNT(DISTINCT b.id) as total_books
+    FROM
+        verses v
+    JOIN
+        chapters c ON v.chapter_id = c.id
+    JOIN
+        books b ON c.book_id = b.id;
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_bible_stats_singleton ON bible_stats (total_verses);
+
+    DROP MATERIALIZED VIEW IF EXISTS user_reading_totals;
+    DROP TABLE IF EXISTS favorite_verse_totals;
+    """)
+
+    conn.commit()
+
+def build_sqlite_backend(conn, sqlite_path):
+    """
+    Export the scripture tables into a read-only SQLite file with an FTS5 index.
+
+    Each verse keeps Postgres' own to_tsvector('english', text) output and the
+    lexicon maps every corpus word to its Postgres lexeme (NULL for stopwords),
+    so the app can reproduce plainto_tsquery matching and ts_rank exactly.
+    """
+    cursor = conn.cursor()
+    tmp_path = sqlite_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    lite = sqlite3.connect(tmp_path)
+    try:
+        lite.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            abbreviation TEXT NOT NULL,
+            testament TEXT NOT NULL,
+            position INTEGER NOT NULL
+        );
+
+        CREATE TABLE chapters (
+            id INTEGER PRIMARY KEY,
+            book_id INTEGER NOT NULL REFERENCES books(id),
+            chapter_number INTEGER NOT NULL,
+            UNIQUE(book_id, chapter_number)
+        );
+
+        CREATE TABLE verses (
+            id INTEGER PRIMARY KEY,
+            chapter_id INTEGER NOT NULL REFERENCES chapters(id),
+            verse_number INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            tsv TEXT NOT NULL,
+            UNIQUE(chapter_id, verse_number)
+        );
+
+        CREATE TABLE lexicon (
+            word TEXT PRIMARY KEY,
+            lexeme TEXT
+        ) WITHOUT ROWID;
+
+        CREATE INDEX idx_books_name ON books(name);
+
+        -- Contentless: only used to find candidate rowids (= verse ids)
+        CREATE VIRTUAL TABLE verses_fts USING fts5(
+            lexemes, content='', prefix='2 3',
+            tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+        );
+        """)
+
+        cursor.execute("SELECT id, name, abbreviation, testament, position FROM books")
+        lite.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?)", cursor.fetchall())
+
+        cursor.execute("SELECT id, book_id, chapter_number FROM chapters")
+        lite.executemany("INSERT INTO chapters VALUES (?, ?, ?)", cursor.fetchall())
+
+        cursor.execute("""
+            SELECT id, chapter_id, verse_number, text, to_tsvector('english', text)::text
+            FROM verses
+        """)
+        words = set()
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            lite.executemany("INSERT INTO verses VALUES (?, ?, ?, ?, ?)", rows)
+            lite.executemany(
+                "INSERT INTO verses_fts (rowid, lexemes) VALUES (?, ?)",
+                [(row[0], " ".join(
+                    re.sub(r"\W", "_", lexeme.replace("''", "'"))
+                    for lexeme in re.findall(r"'((?:[^']|'')*)':", row[4])))
+                 for row in rows]
+            )
+            for row in rows:
+                words.update(WORD_PATTERN.findall(row[3].lower()))
+
+        # Let Postgres normalise every distinct word once
+        words = sorted(words)
+        for start in range(0, len(words), 5000):
+            cursor.execute(
+                "SELECT w, to_tsvector('english', w)::text FROM unnest(%s::text[]) AS w",
+                (words[start:start + 5000],)
+            )
+            lexicon_rows = []
+            for word, tsvector_text in cursor.fetchall():
+                lexemes = re.findall(r"'((?:[^']|'')*)':", tsvector_text)
+                lexicon_rows.append((word, lexemes[0].replace("''", "'") if lexemes else None))
+            lite.executemany("INSERT INTO lexicon VALUES (?, ?)", lexicon_rows)
+
+        lite.execute("INSERT INTO verses_fts (verses_fts) VALUES ('optimize')")
+        lite.commit()
+        lite.execute("VACUUM")
+    finally:
+        lite.close()
+
+    # Swap in atomically so running workers never see a half-written file
+    os.replace(tmp_path, sqlite_path)
+    print(f"SQLite scripture backend written to {sqlite_path} "
+          f"({os.path.getsize(sqlite_path) / (1024 * 1024):.1f} MB, {len(words)} lexicon words)")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,181 @@
+# tests/conftest.py
+"""
+Runs the app without a database server.
+
+Scripture reads use the SQLite backend, on a small file built here with a few
+verses (their tsvectors and lexicon written out by hand, in the format
+importBible.py exports). Postgres-only paths get `postgres`: a connection
+that answers scripted statements and goes through the same counting as a
+real one, in a one-connection pool.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+
+# Must be set before anything imports app.config
+_scripture_dir = tempfile.mkdtemp(prefix="bible-api-tests-")
+os.environ["SCRIPTURE_BACKEND"] = "sqlite"
+os.environ["SCRIPTURE_SQLITE_PATH"] = os.path.join(_scripture_dir, "scripture.sqlite3")
+
+import asyncpg
+import pytest
+from datetime import date, datetime, timezone
+from fastapi.testclient import TestClient
+
+pytest_plugins = ["app.testing"]
+
+BOOKS = [(1, "Psalms", "Ps", "OT", 19), (2, "John", "Jn", "NT", 43)]
+CHAPTERS = [(1, 1, 23), (2, 2, 3)]
+# id, chapter_id, verse_number, text, to_tsvector('english', text)
+VERSES = [
+    (1, 1, 1, "The LORD is my shepherd; I shall not want.",
+     "'lord':2 'shall':7 'shepherd':5 'want':9"),
+    (2, 1, 2, "He maketh me to lie down in green pastures",
+     "'green':8 'lie':5 'maketh':2 'pastur':9"),
+    (3, 2, 16, "For God so loved the world",
+     "'god':2 'love':4 'world':6"),
+]
+# word -> lexeme, None for stopwords
+LEXICON = {
+    "the": None, "lord": "lord", "is": None, "my": None, "shepherd": "shepherd",
+    "i": None, "shall": "shall", "not": None, "want": "want", "he": None,
+    "maketh": "maketh", "me": None, "to": None, "lie": "lie", "down": None,
+    "in": None, "green": "green", "pastures": "pastur", "for": None,
+    "god": "god", "so": None, "loved": "love", "world": "world",
+}
+
+
+def _build_scripture_file(path: str):
+    lite = sqlite3.connect(path)
+    try:
+        lite.executescript("""
+        CREATE TABLE books (id INTEGER PRIMARY KEY, name TEXT NOT NULL, abbreviation TEXT NOT NULL,
+                            testament TEXT NOT NULL, position INTEGER NOT NULL);
+        CREATE TABLE chapters (id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL,
+                               chapter_number INTEGER NOT NULL);
+        CREATE TABLE verses (id INTEGER PRIMARY KEY, chapter_id INTEGER NOT NULL,
+                             verse_number INTEGER NOT NULL, text TEXT NOT NULL, tsv TEXT NOT NULL);
+        CREATE TABLE lexicon (word TEXT PRIMARY KEY, lexeme TEXT) WITHOUT ROWID;
+        CREATE VIRTUAL TABLE verses_fts USING fts5(
+            lexemes, content='', prefix='2 3',
+            tokenize="unicode61 remove_diacritics 0 tokenchars '_'"
+        );
+        """)
+        lite.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?)", BOOKS)
+        lite.executemany("INSERT INTO chapters VALUES (?, ?, ?)", CHAPTERS)
+        lite.executemany("INSERT INTO verses VALUES (?, ?, ?, ?, ?)", VERSES)
+        lite.executemany(
+            "INSERT INTO verses_fts (rowid, lexemes) VALUES (?, ?)",
+            [(verse[0], " ".join(entry.split(":")[0].strip("'") for entry in verse[4].split()))
+             for verse in VERSES])
+        lite.executemany("INSERT INTO lexicon VALUES (?, ?)", LEXICON.items())
+        lite.commit()
+    finally:
+        lite.close()
+
+
+_build_scripture_file(os.environ["SCRIPTURE_SQLITE_PATH"])
+
+from app import database
+from app.database import CountingConnection
+from app.main import app
+from app.models import UserInDB
+from app.utils import get_current_user_from_cookie
+
+TEST_USER = UserInDB(
+    user_id=1, username="reader", email="reader@example.com", first_name="Ada", last_name="Reader",
+    password_hash="x", created_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+
+class _ScriptedTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        await self.conn.execute("BEGIN")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class _Scripted(asyncpg.Connection):
+    """Stands in for the server below CountingConnection, so counting runs as in production."""
+
+    def __init__(self):
+        # query fragment -> what fetch/fetchrow/fetchval return for it
+        self.answers = {}
+        self.statements = []
+
+    def _answer(self, query):
+        self.statements.append(" ".join(query.split()))
+        for fragment, answer in self.answers.items():
+            if fragment in query:
+                return answer
+        raise AssertionError(f"Unscripted statement: {self.statements[-1][:120]}")
+
+    async def execute(self, query, *args, timeout=None):
+        self.statements.append(" ".join(query.split()))
+        return "OK"
+
+    async def fetch(self, query, *args, timeout=None, record_class=None):
+        return self._answer(query)
+
+    async def fetchrow(self, query, *args, timeout=None, record_class=None):
+        return self._answer(query)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        return self._answer(query)
+
+    def transaction(self, **kwargs):
+        return _ScriptedTransaction(self)
+
+    async def reset(self, *, timeout=None):
+        pass
+
+    def is_closed(self):
+        return False
+
+    def __del__(self):
+        pass
+
+
+class ScriptedConnection(CountingConnection, _Scripted):
+    pass
+
+
+class _OneConnectionPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def acquire(self, timeout=None):
+        return self.conn
+
+    async def release(self, conn):
+        await conn.reset()
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """The scripted connection every db_connection() hands out; set `.answers` on it."""
+    conn = ScriptedConnection()
+    monkeypatch.setattr(database, "_write_pool", _OneConnectionPool(conn))
+    return conn
+
+
+@pytest.fixture
+def client():
+    # Without `with`, startup (warmup, scheduler) doesn't run: nothing connects anywhere
+    app.dependency_overrides[get_current_user_from_cookie] = lambda: TEST_USER
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def devotional_row(favorite_verses=(), **fields):
+    now = datetime.now(timezone.utc)
+    return {
+        "devotional_id": 7, "user_id": TEST_USER.user_id, "devotional_date": date.today(),
+        "reflection": "Still waters", "created_at": now, "updated_at": now,
+        "favorite_verses": json.dumps(list(favorite_verses)), **fields,
+    }
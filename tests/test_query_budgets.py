@@ -0,0 +1,70 @@
+# tests/test_query_budgets.py
+"""
+Database round trips per endpoint. A budget going up (an N+1 loop, a
+read-back after a write, an extra connection) should be a deliberate change
+to this file, not something found in production.
+
+Authentication is overridden in these tests, so its user lookup isn't part
+of any budget.
+"""
+import pytest
+from app import crud
+from app.testing import QueryBudget
+from tests.conftest import VERSES, devotional_row
+
+BUDGETS = {
+    # SQLite scripture backend: one lookup, no pooled connection
+    "/verses/Psalms/23": QueryBudget(queries=1, connections=0),
+    "/search?query=shepherd": QueryBudget(queries=1, connections=0),
+    '/search?query="green pastures"': QueryBudget(queries=1, connections=0),
+    "/search?query=love&facets=true": QueryBudget(queries=1, connections=0),
+    "/search?query=lord&book=Psalms": QueryBudget(queries=1, connections=0),
+    # Devotional and its favorites in one statement
+    "/devotionals/today": QueryBudget(queries=1, connections=1),
+    # BEGIN, upsert, favorites sync (which returns the favorites), COMMIT
+    "/devotionals/save": QueryBudget(queries=4, connections=1),
+}
+
+
+@pytest.mark.parametrize("path", [path for path in BUDGETS if not path.startswith("/devotionals")])
+def test_scripture_reads(client, query_budget, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    query_budget(response, **BUDGETS[path]._asdict())
+
+
+def test_devotional_today(client, postgres, query_budget):
+    favorite = {"verse_id": 1, "book_name": "Psalms", "chapter_number": 23,
+                "verse_number": 1, "text": VERSES[0][3]}
+    postgres.answers = {crud.DEVOTIONAL_WITH_FAVORITES_QUERY: devotional_row([favorite])}
+
+    response = client.get("/devotionals/today")
+
+    assert response.status_code == 200
+    assert response.json()["favorite_verses"] == [favorite]
+    query_budget(response, **BUDGETS["/devotionals/today"]._asdict())
+
+
+def test_devotional_save_has_no_read_back(client, postgres, query_budget):
+    favorites = [{"verse_id": verse_id, "book_name": "Psalms", "chapter_number": 23,
+                  "verse_number": verse_number, "text": text}
+                 for verse_id, _, verse_number, text, _ in VERSES[:2]]
+    saved = devotional_row(inserted=False)
+    del saved["favorite_verses"]
+    postgres.answers = {
+        "INSERT INTO devotionals": saved,
+        crud.FAVORITES_SYNC_QUERY: favorites,
+    }
+
+    response = client.post("/devotionals/save", json={"reflection": "Still waters", "favorite_verses": [1, 2]})
+
+    assert response.status_code == 200
+    assert [verse["verse_id"] for verse in response.json()["favorite_verses"]] == [1, 2]
+    assert not any("FROM devotionals d" in statement for statement in postgres.statements)
+    query_budget(response, **BUDGETS["/devotionals/save"]._asdict())
+
+
+def test_over_budget_fails(client, query_budget):
+    response = client.get("/verses/Psalms/23")
+    with pytest.raises(AssertionError, match="over its query budget: queries 1 > 0"):
+        query_budget(response, queries=0)
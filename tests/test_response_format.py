@@ -0,0 +1,24 @@
+# tests/test_response_format.py
+"""
+The verse routes answer in JSON objects, columns or MessagePack depending on
+the request, so caches have to key every response on Accept.
+"""
+import pytest
+
+PATHS = ["/verses/Psalms/23", "/search?query=shepherd", "/search?query=love&facets=true"]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_default_json_varies_on_accept(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["vary"] == "Accept"
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_shaped_response_varies_on_accept(client, path):
+    separator = "&" if "?" in path else "?"
+    response = client.get(f"{path}{separator}format=columns")
+    assert response.status_code == 200
+    assert response.headers["vary"] == "Accept"
@@ -0,0 +1,43 @@
+# tests/test_scripture_sqlite.py
+"""
+The SQLite backend has to answer searches the way Postgres' to_tsvector /
+plainto_tsquery would. The fixture corpus (tests/conftest.py) never uses
+"shepherding" or "pasture", but Postgres stems them to lexemes it does
+contain ("shepherd", "pastur"), so they match there and must match here.
+"""
+import pytest
+from app import scripture_sqlite
+
+
+@pytest.mark.parametrize("word, lexeme", [
+    ("shepherding", "shepherd"),
+    ("pasture", "pastur"),
+    ("ourselves", None),
+    ("3rd", "3rd"),
+])
+def test_words_missing_from_the_lexicon_are_stemmed(word, lexeme):
+    assert scripture_sqlite._lexicon_for(scripture_sqlite._get_connection(), [word]) == {word: lexeme}
+
+
+@pytest.mark.parametrize("query, verse", [
+    ("shepherding", (23, 1)),
+    ("green pasture", (23, 2)),
+    ("the shepherding", (23, 1)),
+])
+def test_full_text_search_matches_unused_inflections(query, verse):
+    results = scripture_sqlite._search_full_text(scripture_sqlite._get_connection(), query, None)
+    assert [(r["chapter_number"], r["verse_number"]) for r in results] == [verse]
+
+
+@pytest.mark.parametrize("query, verse", [
+    ('"green pasture"', (23, 2)),
+    ("shepherding -pasture", (23, 1)),
+])
+def test_advanced_search_matches_unused_inflections(query, verse):
+    from app.search_query import parse_search_query
+    results = scripture_sqlite._search_advanced(parse_search_query(query), None)
+    assert [(r["chapter_number"], r["verse_number"]) for r in results] == [verse]
+
+
+def test_unknown_stem_matches_nothing():
+    assert scripture_sqlite._search_full_text(scripture_sqlite._get_connection(), "xylophones", None) == []
@@ -0,0 +1,32 @@
+# tests/test_singleflight.py
+import asyncio
+from app import query_counter
+from app.query_counter import QueryCounts, count_connection, count_query
+from app.singleflight import SingleFlight
+
+
+def test_coalesced_callers_each_get_the_shared_calls_counts():
+    flights = SingleFlight()
+    runs = 0
+
+    async def read():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        count_connection()
+        count_query(rows=3)
+        return "verses"
+
+    async def request():
+        counts = QueryCounts()
+        query_counter._counts.set(counts)
+        assert await flights.do("read", (), read) == "verses"
+        return counts
+
+    async def main():
+        return await asyncio.gather(request(), request())
+
+    leader, follower = asyncio.run(main())
+    assert runs == 1
+    assert leader == follower == QueryCounts(connections=1, queries=1, rows=3)
+    assert flights.counters["read"]["coalesced"] == 1
@@ -0,0 +1,29 @@
+# tests/test_verse_of_day.py
+import asyncio
+from datetime import date
+from app import verse_of_day
+
+TODAY = date(2024, 6, 1)
+
+
+def test_schedule_edits_reach_days_already_in_the_window(monkeypatch):
+    schedule = {TODAY: "Psalms 23:1"}
+    resolved = []
+
+    async def resolve(reference):
+        resolved.append(reference)
+        return {"reference": reference}
+
+    monkeypatch.setattr(verse_of_day, "load_schedule", lambda: dict(schedule))
+    monkeypatch.setattr(verse_of_day, "_resolve_reference", resolve)
+    monkeypatch.setattr(verse_of_day, "_window", {})
+
+    asyncio.run(verse_of_day.refresh_window(TODAY))
+    assert verse_of_day.get_verse_of_the_day(TODAY)["entry"]["reference"] == "Psalms 23:1"
+
+    resolved.clear()
+    schedule[TODAY] = "John 3:16"
+    asyncio.run(verse_of_day.refresh_window(TODAY))
+    assert verse_of_day.get_verse_of_the_day(TODAY)["entry"]["reference"] == "John 3:16"
+    # Only the edited day is resolved again
+    assert resolved == ["John 3:16"]